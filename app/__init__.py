@@ -7,6 +7,13 @@ from flask_api import FlaskAPI
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
 from instance.config import app_config
+from app.events import events
+from app.changes import changes
+from app.idempotency import idempotency
+from app.admission import admission
+from app.replication.log import oplog
+from app.business.ingest import review_queue
+from app.tracing import tracer, span, traced
 
 jwt = JWTManager()
 mail = Mail()
@@ -21,10 +28,21 @@ def create_app(config_name):
     app.config.from_pyfile('config.py')
     jwt.init_app(app)
     mail.init_app(app)
+    events.init_app(app)
+    changes.init_app(app)
+    idempotency.init_app(app)
+    admission.init_app(app)
+    oplog.init_app(app)
+    review_queue.init_app(app)
+    tracer.init_app(app)
 
     from app.auth.views import auth
     from app.auth.views import blacklist
     from app.business.views import biz, rev
+    from app.admin.views import admin
+    from app.replication.views import replication
+    from app.auth.tokens import paired_refresh_claims
+    from app.compression import compress_response
 
     @app.errorhandler(400)
     def bad_request(error):
@@ -53,11 +71,25 @@ def create_app(config_name):
     @jwt.token_in_blacklist_loader
     def check_if_token_in_blacklist(decrypted_token):
         """Check if token is blaclisted before allowing access to a route"""
-        jti = decrypted_token['jti']
-        return jti in blacklist
+        with span('jwt.blacklist'):
+            jti = decrypted_token['jti']
+            return jti in blacklist
+
+    jwt.user_claims_loader(paired_refresh_claims)
+
+    app.before_request(tracer.start_request)
+    app.after_request(traced('compress')(compress_response))
+    app.after_request(tracer.finish_request)
+    app.teardown_request(tracer.end_request)
 
     app.register_blueprint(auth)
     app.register_blueprint(biz)
     app.register_blueprint(rev)
+    app.register_blueprint(admin)
+    app.register_blueprint(replication)
+
+    if app.config['REPLICATION_ENABLED']:
+        from app.replication import peers
+        peers.init_app(app)
 
     return app
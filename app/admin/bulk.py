@@ -0,0 +1,195 @@
+"""Streaming newline-delimited JSON import and export of the directory
+
+Every line holds one record with a "type" of user, business or review.
+Export yields one line at a time from the live store. Import parses one
+line at a time, validates it with the BaseView rules and inserts the
+valid records in batches.
+"""
+import json
+from app.auth.views import users
+from app.baseview import BaseView
+from app.business.views import store, publish_change, EVENT_FIELDS
+from app.models import User, Business
+from app.replication.log import oplog
+
+MAX_ERRORS = 100
+
+
+def export_records():
+    """Yield every user, business and review as one NDJSON line each"""
+    for user in users:
+        yield dump({'type': 'user', 'email': user.email,
+                    'username': user.username,
+                    'password_hash': user.password})
+    for business in store:
+        record = business.serialize(EVENT_FIELDS)
+        record.update(type='business', created_by=business.created_by)
+        yield dump(record)
+    for business in store:
+        for review in business.reviews:
+            yield dump({'type': 'review', 'business_id': business.id,
+                        'review': review})
+
+
+def dump(record):
+    return json.dumps(record) + '\n'
+
+
+def error_message(error):
+    """Return the message of a BaseView validation error response"""
+    return json.loads(error[0].get_data().decode())['message']
+
+
+class Importer():
+    """Validate NDJSON records and insert them in batches"""
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.emails = {user.email for user in users}
+        self.names = {business.name for business in store}
+        self.business_ids = {}
+        self.pending_users = []
+        self.pending_businesses = []
+        self.pending_reviews = []
+        self.counts = {'users': 0, 'businesses': 0, 'reviews': 0}
+        self.errors = []
+        self.error_count = 0
+
+    def run(self, lines):
+        """Import every line and return a summary"""
+        for number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode()
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                self.error(number, 'The line is not valid JSON')
+                continue
+            if not isinstance(record, dict):
+                self.error(number, 'The line should be a JSON object')
+                continue
+            loader = getattr(self, f'load_{record.get("type")}', None)
+            if loader is None:
+                self.error(number, 'The type should be one of user,' +
+                                   ' business, review')
+                continue
+            message = loader(record)
+            if message:
+                self.error(number, message)
+            elif self.pending() >= self.batch_size:
+                self.flush()
+        self.flush()
+        return dict(self.counts, errors=self.errors,
+                    error_count=self.error_count)
+
+    def error(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'line': number, 'message': message})
+
+    def pending(self):
+        return (len(self.pending_users) + len(self.pending_businesses) +
+                len(self.pending_reviews))
+
+    @staticmethod
+    def check_types(record, strings=(), integers=()):
+        """Return a message for the first field of the wrong JSON type"""
+        for field in strings:
+            value = record.get(field)
+            if value is not None and not isinstance(value, str):
+                return f'The {field} should be a string'
+        for field in integers:
+            value = record.get(field)
+            if value is not None and (isinstance(value, bool) or
+                                      not isinstance(value, int)):
+                return f'The {field} should be an integer'
+
+    def load_user(self, record):
+        message = self.check_types(record, strings=('email', 'username',
+                                                    'password',
+                                                    'password_hash'))
+        if message:
+            return message
+        email = record.get('email')
+        username = record.get('username')
+        password = record.get('password')
+        password_hash = record.get('password_hash')
+        user_data = {'email': email, 'username': username,
+                     'password': password or password_hash}
+        for error in (BaseView.validate_null(**user_data),
+                      BaseView.check_email(email)):
+            if error:
+                return error_message(error)
+        if password_hash is None and BaseView.check_password(password):
+            return error_message(BaseView.check_password(password))
+        email = BaseView.normalize_email(email)
+        if email in self.emails:
+            return 'User already exists'
+        username = BaseView.remove_extra_spaces(name=username)['name']
+        self.emails.add(email)
+        self.pending_users.append(User(email, username, password,
+                                       password_hash=password_hash))
+
+    def load_business(self, record):
+        message = self.check_types(record, strings=('business_name',
+                                                    'category', 'location',
+                                                    'created_by'),
+                                   integers=('business_id',))
+        if message:
+            return message
+        data_ = dict(name=record.get('business_name'),
+                     category=record.get('category'),
+                     location=record.get('location'))
+        error = BaseView.validate_null(**data_,
+                                       created_by=record.get('created_by'))
+        if error:
+            return error_message(error)
+        data = BaseView.remove_extra_spaces(**data_)
+        if data['name'] in self.names:
+            name = data['name']
+            return f'Business with name {name} already exists'
+        if record['created_by'] not in self.emails:
+            return 'The business owner is not registered'
+        self.names.add(data['name'])
+        business = Business(**data, created_by=record['created_by'])
+        self.business_ids[record.get('business_id')] = business
+        self.pending_businesses.append(business)
+
+    def load_review(self, record):
+        message = self.check_types(record, strings=('review',),
+                                   integers=('business_id',))
+        if message:
+            return message
+        error = BaseView.validate_null(review=record.get('review'))
+        if error:
+            return error_message(error)
+        business = self.business_ids.get(record.get('business_id'))
+        if business is None:
+            business_id = record.get('business_id')
+            return f'The business with id {business_id} is not available'
+        review = BaseView.remove_extra_spaces(review=record['review'])
+        self.pending_reviews.append((business, review['review']))
+
+    def flush(self):
+        """Insert the pending batch into the store"""
+        users.extend(self.pending_users)
+        for user in self.pending_users:
+            oplog.record('user.registered',
+                         {'email': user.email, 'username': user.username,
+                          'password_hash': user.password},
+                         key=('user', user.email))
+        store.extend(self.pending_businesses)
+        for business in self.pending_businesses:
+            publish_change('business.created', business.id, business)
+        for business, review in self.pending_reviews:
+            business.reviews.append(review)
+            publish_change('review.created', business.id, business,
+                           data={'business_id': business.id,
+                                 'review': review})
+        self.counts['users'] += len(self.pending_users)
+        self.counts['businesses'] += len(self.pending_businesses)
+        self.counts['reviews'] += len(self.pending_reviews)
+        self.pending_users = []
+        self.pending_businesses = []
+        self.pending_reviews = []
@@ -0,0 +1,121 @@
+"""Memory accounting of the in-process state
+
+Reports the number of objects and their approximate deep size in bytes
+for every structure the app keeps in memory, and takes tracemalloc
+snapshots that can be diffed against the previous one.
+"""
+import sys
+import tracemalloc
+from collections import deque
+from types import FunctionType, ModuleType
+from app.auth.views import users, blacklist
+from app.auth.tokens import claims_cache, refresh_tokens
+from app.business.views import store
+from app.business.indexes import names, owners
+from app.changes import changes
+from app.events import events
+from app.idempotency import idempotency
+from app.replication.log import oplog
+from app.analytics import analytics
+from app.business.ingest import review_queue
+from app.tracing import tracer
+
+TOP_STATS = 10
+snapshots = {'last': None}
+
+
+def deep_size(obj, seen):
+    """Approximate size of obj and everything it references, once each"""
+    size = 0
+    pending = [obj]
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, (type, FunctionType,
+                                               ModuleType)):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+            pending.extend(obj)
+        if hasattr(obj, '__dict__'):
+            pending.append(obj.__dict__)
+    return size
+
+
+def structures():
+    """Return the tracked structures as name: (count, object)"""
+    return {
+        'reviews': (sum(len(business.reviews) for business in store),
+                    [business.reviews for business in store]),
+        'businesses': (len(store), store),
+        'users': (len(users), users),
+        'blacklist': (len(blacklist), blacklist),
+        'claims_cache': (len(claims_cache), claims_cache.entries),
+        'refresh_tokens': (sum(len(jtis) for jtis in refresh_tokens.values()),
+                           refresh_tokens),
+        'events': (len(events.buffer), events.buffer),
+        'changes': (len(changes.entries), changes.entries),
+        'idempotency': (len(idempotency), idempotency.entries),
+        'name_index': (len(names), names.keys),
+        'owner_index': (len(owners), owners.by_owner),
+        'replication_log': (len(oplog.ops), oplog.ops),
+        'analytics': (len(analytics), [analytics.businesses.columns,
+                                       analytics.reviews.columns]),
+        'review_queue': (len(review_queue.statuses),
+                         [review_queue.queue, review_queue.statuses]),
+        'traces': (len(getattr(tracer.exporter, 'traces', ())),
+                   getattr(tracer.exporter, 'traces', ())),
+    }
+
+
+def account():
+    """Return object counts and deep sizes per structure
+
+    Bytes are attributed to the first structure that reaches them, so
+    businesses exclude the review strings already counted in reviews.
+    """
+    seen = set()
+    report = {}
+    for name, (count, obj) in structures().items():
+        report[name] = {'count': count, 'bytes': deep_size(obj, seen)}
+    return {'structures': report,
+            'total_count': sum(item['count'] for item in report.values()),
+            'total_bytes': sum(item['bytes'] for item in report.values()),
+            'tracing': tracemalloc.is_tracing()}
+
+
+def format_stats(stats):
+    return [{'location': str(stat.traceback), 'size': stat.size,
+             'count': stat.count,
+             'size_diff': getattr(stat, 'size_diff', None),
+             'count_diff': getattr(stat, 'count_diff', None)}
+            for stat in stats[:TOP_STATS]]
+
+
+def trace(action):
+    """Start or stop tracemalloc, or take a snapshot and diff it"""
+    if action == 'start':
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        snapshots['last'] = None
+        return {'message': 'Allocation tracing started'}
+    if action == 'stop':
+        tracemalloc.stop()
+        snapshots['last'] = None
+        return {'message': 'Allocation tracing stopped'}
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    response = {'message': 'Allocation snapshot taken',
+                'current': current, 'peak': peak,
+                'top': format_stats(snapshot.statistics('lineno')),
+                'diff': None}
+    if snapshots['last'] is not None:
+        response['diff'] = format_stats(
+            snapshot.compare_to(snapshots['last'], 'lineno'))
+    snapshots['last'] = snapshot
+    return response
@@ -0,0 +1,142 @@
+"""Contains administrator views to import and export the directory"""
+from flask import Blueprint, request, jsonify, Response, current_app
+from flask import stream_with_context
+from flask_jwt_extended import get_jwt_identity
+from app.baseview import BaseView
+from app.auth.tokens import jwt_required
+from app.admin.bulk import Importer, export_records
+from app.admin import memory
+from app.admission import admission
+from app.analytics import analytics
+from app.tracing import tracer
+
+admin = Blueprint('admin', __name__, url_prefix='/api/v1/admin')
+
+
+class ImportData(BaseView):
+    """Method to import users, businesses and reviews"""
+    @jwt_required
+    def post(self):
+        """Endpoint to import a newline-delimited JSON stream"""
+        if self.check_admin(get_jwt_identity()):
+            return self.check_admin(get_jwt_identity())
+        importer = Importer(current_app.config['IMPORT_BATCH_SIZE'])
+        summary = importer.run(request.stream)
+        summary['message'] = 'Import completed'
+        return jsonify(summary), 201
+
+
+class ExportData(BaseView):
+    """Method to export users, businesses and reviews"""
+    @jwt_required
+    def get(self):
+        """Endpoint to stream the directory as newline-delimited JSON"""
+        if self.check_admin(get_jwt_identity()):
+            return self.check_admin(get_jwt_identity())
+        return Response(stream_with_context(export_records()),
+                        mimetype='application/x-ndjson')
+
+
+class MemoryUsage(BaseView):
+    """Method to report the memory held by the in-process state"""
+    @jwt_required
+    def get(self):
+        """Endpoint to return object counts and sizes per structure"""
+        if self.check_admin(get_jwt_identity()):
+            return self.check_admin(get_jwt_identity())
+        return jsonify(memory.account()), 200
+
+    @jwt_required
+    def post(self):
+        """Endpoint to start, stop or snapshot allocation tracing"""
+        if self.check_admin(get_jwt_identity()):
+            return self.check_admin(get_jwt_identity())
+        if self.validate_json():
+            return self.validate_json()
+        action = request.get_json().get('action')
+        if action not in ('start', 'snapshot', 'stop'):
+            response = {'message': 'The action should be one of start,' +
+                                   ' snapshot, stop'}
+            return jsonify(response), 400
+        response = memory.trace(action)
+        if response is None:
+            response = {'message': 'Allocation tracing is not started'}
+            return jsonify(response), 409
+        return jsonify(response), 200
+
+
+class AdmissionMetrics(BaseView):
+    """Method to report admission control metrics"""
+    @jwt_required
+    def get(self):
+        """Endpoint to return admitted and shed requests per class"""
+        if self.check_admin(get_jwt_identity()):
+            return self.check_admin(get_jwt_identity())
+        return jsonify({'classes': admission.metrics()}), 200
+
+
+class BusinessStats(BaseView):
+    """Method to report business counts per category and location"""
+    @jwt_required
+    def get(self):
+        """Endpoint to return live businesses grouped by ?group_by="""
+        if self.check_admin(get_jwt_identity()):
+            return self.check_admin(get_jwt_identity())
+        group_by = request.args.get('group_by', 'category', type=str)
+        fields = group_by.split(',')
+        if len(fields) > 2 or len(set(fields)) != len(fields) or \
+                not set(fields) <= {'category', 'location'}:
+            response = {'message': 'The group_by should be category,' +
+                                   ' location or both'}
+            return jsonify(response), 400
+        response = {'group_by': fields,
+                    'groups': analytics.businesses_by(*fields)}
+        return jsonify(response), 200
+
+
+class ReviewStats(BaseView):
+    """Method to report review volume, lengths and top reviewers"""
+    @jwt_required
+    def get(self):
+        """Endpoint to return review aggregates"""
+        if self.check_admin(get_jwt_identity()):
+            return self.check_admin(get_jwt_identity())
+        top = request.args.get('top', 10, type=int)
+        bins = request.args.get('bins', 10, type=int)
+        if not 1 <= top <= 100 or not 1 <= bins <= 100:
+            response = {'message': 'The top and bins should be between' +
+                                   ' 1 and 100'}
+            return jsonify(response), 400
+        response = {'review_volume': analytics.review_volume(top),
+                    'review_lengths': analytics.review_lengths(bins),
+                    'top_reviewers': analytics.top_reviewers(top)}
+        return jsonify(response), 200
+
+
+class RecentTraces(BaseView):
+    """Method to return the traces kept by the in-memory exporter"""
+    @jwt_required
+    def get(self):
+        """Endpoint to return the last ?limit= sampled traces"""
+        if self.check_admin(get_jwt_identity()):
+            return self.check_admin(get_jwt_identity())
+        traces = getattr(tracer.exporter, 'traces', None)
+        if traces is None:
+            response = {'message': 'Traces are not kept in memory'}
+            return jsonify(response), 409
+        limit = request.args.get('limit', 20, type=int)
+        if not 1 <= limit <= 1000:
+            response = {'message': 'The limit should be between 1 and 1000'}
+            return jsonify(response), 400
+        return jsonify({'traces': list(traces)[-limit:]}), 200
+
+
+admin.add_url_rule('/import', view_func=ImportData.as_view('import'))
+admin.add_url_rule('/export', view_func=ExportData.as_view('export'))
+admin.add_url_rule('/memory', view_func=MemoryUsage.as_view('memory'))
+admin.add_url_rule('/admission',
+                   view_func=AdmissionMetrics.as_view('admission'))
+admin.add_url_rule('/stats', view_func=BusinessStats.as_view('stats'))
+admin.add_url_rule('/stats/reviews',
+                   view_func=ReviewStats.as_view('review-stats'))
+admin.add_url_rule('/traces', view_func=RecentTraces.as_view('traces'))
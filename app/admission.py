@@ -0,0 +1,117 @@
+"""Admission control with load shedding for CPU heavy endpoints
+
+Each endpoint class runs at most `limit` requests at a time. Further
+requests queue for at most `queue_budget` seconds; a request whose
+estimated wait already exceeds the budget is shed at once with a 503
+and a Retry-After header instead of queueing until the client times out.
+Endpoints outside any class are never held back.
+"""
+import math
+import threading
+import time
+from functools import wraps
+from flask import jsonify
+
+SMOOTHING = 0.2
+
+
+class EndpointClass():
+    """Concurrency limit, queue and counters of one endpoint class"""
+    def __init__(self, limit, queue_budget):
+        self.limit = limit
+        self.queue_budget = queue_budget
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.service_time = 0.0
+        self.condition = threading.Condition()
+
+    def estimated_wait(self):
+        """Seconds a request arriving now is expected to queue"""
+        if self.active < self.limit:
+            return 0.0
+        return (self.waiting + 1) / self.limit * self.service_time
+
+    def acquire(self):
+        """Return None once admitted, else the seconds to retry after"""
+        with self.condition:
+            wait = self.estimated_wait()
+            if wait > self.queue_budget:
+                self.shed += 1
+                return wait
+            deadline = time.time() + self.queue_budget
+            self.waiting += 1
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.shed += 1
+                        return max(self.estimated_wait(), self.queue_budget)
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return None
+
+    def release(self, elapsed):
+        with self.condition:
+            self.active -= 1
+            self.service_time += SMOOTHING * (elapsed - self.service_time)
+            self.condition.notify()
+
+    def metrics(self):
+        with self.condition:
+            return {'limit': self.limit, 'queue_budget': self.queue_budget,
+                    'active': self.active, 'waiting': self.waiting,
+                    'admitted': self.admitted, 'shed': self.shed,
+                    'service_time': self.service_time}
+
+
+class AdmissionController():
+    """Endpoint classes configured from ADMISSION_CLASSES"""
+    def __init__(self):
+        self.classes = {}
+
+    def init_app(self, app):
+        for name, settings in app.config['ADMISSION_CLASSES'].items():
+            endpoint_class = self.classes.get(name)
+            if endpoint_class is None:
+                self.classes[name] = EndpointClass(**settings)
+            else:
+                endpoint_class.limit = settings['limit']
+                endpoint_class.queue_budget = settings['queue_budget']
+
+    def metrics(self):
+        return {name: endpoint_class.metrics()
+                for name, endpoint_class in self.classes.items()}
+
+    def reset(self):
+        self.classes.clear()
+
+
+admission = AdmissionController()
+
+
+def admitted(class_name):
+    """Run the view only once admitted to the endpoint class"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            endpoint_class = admission.classes.get(class_name)
+            if endpoint_class is None:
+                return fn(*args, **kwargs)
+            retry_after = endpoint_class.acquire()
+            if retry_after is not None:
+                response = {'message': 'The server is busy.' +
+                                       ' Please retry later'}
+                headers = {'Retry-After': str(max(1, math.ceil(retry_after)))}
+                return jsonify(response), 503, headers
+            start = time.time()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                endpoint_class.release(time.time() - start)
+        return wrapper
+    return decorate
@@ -0,0 +1,185 @@
+"""Columnar mirror of businesses and reviews for aggregate statistics
+
+Every change published by publish_change is applied to NumPy arrays,
+one per field, with strings dictionary encoded to integer codes. Group
+bys and histograms are then computed with vectorized operations over
+whole columns instead of iterating over Business objects. Deleted
+businesses are only marked dead; once at least compact_after of them
+make up half the rows, dead businesses and their reviews are dropped.
+"""
+import threading
+import numpy as np
+
+NO_REVIEWER = -1
+
+
+class Encoder():
+    """Dictionary encoding of strings to consecutive integer codes"""
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __len__(self):
+        return len(self.values)
+
+
+class Table():
+    """Growable set of equally long NumPy columns"""
+    def __init__(self, dtypes, capacity=1024):
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype)
+                        for name, dtype in dtypes.items()}
+
+    def append(self, **values):
+        """Append one row and return its index"""
+        capacity = len(next(iter(self.columns.values())))
+        if self.size == capacity:
+            for name, column in self.columns.items():
+                grown = np.zeros(capacity * 2, dtype=column.dtype)
+                grown[:capacity] = column
+                self.columns[name] = grown
+        row = self.size
+        for name, value in values.items():
+            self.columns[name][row] = value
+        self.size += 1
+        return row
+
+    def keep(self, mask):
+        """Drop the rows where mask is False, keeping the capacity"""
+        for name, column in self.columns.items():
+            kept = column[:self.size][mask]
+            column[:len(kept)] = kept
+        self.size = int(mask.sum())
+
+    def __getitem__(self, name):
+        return self.columns[name][:self.size]
+
+
+class Analytics():
+    """Incrementally maintained columnar mirror of the store"""
+    def __init__(self, compact_after=1024):
+        self.compact_after = compact_after
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.businesses = Table({'business_id': np.int64, 'alive': np.bool_,
+                                 'category': np.int32,
+                                 'location': np.int32})
+        self.reviews = Table({'business': np.int32, 'length': np.int32,
+                              'reviewer': np.int32})
+        self.rows = {}
+        self.dead = 0
+        self.categories = Encoder()
+        self.locations = Encoder()
+        self.reviewers = Encoder()
+
+    def record(self, event, business_id, business, data):
+        """Apply one published change to the columns"""
+        with self.lock:
+            row = self.rows.get(business_id)
+            if event == 'business.created' and row is None:
+                self.rows[business_id] = self.businesses.append(
+                    business_id=business_id, alive=True,
+                    category=self.categories.encode(business.category),
+                    location=self.locations.encode(business.location))
+            elif event == 'business.updated' and row is not None:
+                columns = self.businesses.columns
+                columns['category'][row] = self.categories.encode(
+                    business.category)
+                columns['location'][row] = self.locations.encode(
+                    business.location)
+            elif event == 'business.deleted' and row is not None:
+                self.businesses.columns['alive'][row] = False
+                del self.rows[business_id]
+                self.dead += 1
+                if (self.dead >= self.compact_after and
+                        self.dead * 2 >= self.businesses.size):
+                    self.compact()
+            elif event == 'review.created' and row is not None:
+                reviewer = data.get('reviewed_by')
+                self.reviews.append(
+                    business=row, length=len(data['review']),
+                    reviewer=NO_REVIEWER if reviewer is None
+                    else self.reviewers.encode(reviewer))
+
+    def compact(self):
+        """Drop dead businesses and their reviews, renumbering the rows"""
+        alive = self.businesses['alive'].copy()
+        renumbered = np.cumsum(alive) - 1
+        self.reviews.keep(self.live_reviews())
+        business = self.reviews.columns['business']
+        business[:self.reviews.size] = renumbered[self.reviews['business']]
+        self.businesses.keep(alive)
+        self.rows = {business_id: row for row, business_id in
+                     enumerate(self.businesses['business_id'].tolist())}
+        self.dead = 0
+
+    def businesses_by(self, *fields):
+        """Count live businesses per value of one or two fields"""
+        encoders = {'category': self.categories,
+                    'location': self.locations}
+        with self.lock:
+            alive = self.businesses['alive']
+            combined = np.zeros(int(alive.sum()), dtype=np.int64)
+            for field in fields:
+                combined = (combined * len(encoders[field]) +
+                            self.businesses[field][alive])
+            values, counts = np.unique(combined, return_counts=True)
+            groups = []
+            for value, count in zip(values.tolist(), counts.tolist()):
+                keys = []
+                for field in reversed(fields):
+                    value, code = divmod(value, len(encoders[field]))
+                    keys.append(encoders[field].values[code])
+                groups.append(dict(zip(fields, reversed(keys)),
+                                   count=count))
+            return groups
+
+    def live_reviews(self):
+        """Mask of the reviews whose business still exists"""
+        return self.businesses['alive'][self.reviews['business']]
+
+    def review_volume(self, top):
+        """Return the top businesses by number of reviews"""
+        with self.lock:
+            rows = self.reviews['business'][self.live_reviews()]
+            counts = np.bincount(rows, minlength=self.businesses.size)
+            order = np.argsort(-counts, kind='stable')[:top]
+            business_ids = self.businesses['business_id']
+            return [{'business_id': int(business_ids[row]),
+                     'reviews': int(counts[row])}
+                    for row in order if counts[row]]
+
+    def review_lengths(self, bins):
+        """Return a histogram of review lengths in characters"""
+        with self.lock:
+            lengths = self.reviews['length'][self.live_reviews()]
+            if not len(lengths):
+                return {'counts': [], 'edges': []}
+            counts, edges = np.histogram(lengths, bins=bins)
+            return {'counts': counts.tolist(), 'edges': edges.tolist()}
+
+    def top_reviewers(self, top):
+        """Return the users who wrote the most reviews"""
+        with self.lock:
+            reviewers = self.reviews['reviewer'][self.live_reviews()]
+            reviewers = reviewers[reviewers != NO_REVIEWER]
+            counts = np.bincount(reviewers, minlength=len(self.reviewers))
+            order = np.argsort(-counts, kind='stable')[:top]
+            return [{'email': self.reviewers.values[code],
+                     'reviews': int(counts[code])}
+                    for code in order if counts[code]]
+
+    def __len__(self):
+        return self.businesses.size + self.reviews.size
+
+
+analytics = Analytics()
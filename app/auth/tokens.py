@@ -0,0 +1,185 @@
+"""Token issuing helpers and caching versions of the flask_jwt_extended
+    route decorators
+
+A token is decoded, its signature verified and checked against the
+blacklist only the first time it is seen. The verified claims are then
+kept in a bounded LRU cache keyed by the raw token until the token
+expires or its jti is revoked.
+
+Every access token carries the jti of the refresh token it was issued
+with, so that logging out can revoke both.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, current_app, g, _app_ctx_stack as ctx_stack
+import flask_jwt_extended
+from flask_jwt_extended import (get_raw_jwt, create_access_token,
+                                create_refresh_token, decode_token)
+from app.replication.log import oplog
+from app.tracing import span, start_span, end_span
+
+refresh_tokens = {}
+
+
+class ClaimsCache():
+    """LRU cache of verified claims keyed by the raw token"""
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.tokens_by_jti = {}
+        self.lock = threading.Lock()
+
+    def get(self, token):
+        """Return the cached claims of an unexpired token or None"""
+        with self.lock:
+            claims = self.entries.get(token)
+            if claims is None:
+                return None
+            if claims.get('exp', 0) <= time.time():
+                self._remove(token)
+                return None
+            self.entries.move_to_end(token)
+            return claims
+
+    def put(self, token, claims, maxsize):
+        """Cache the claims of a verified token"""
+        with self.lock:
+            self.entries[token] = claims
+            self.entries.move_to_end(token)
+            self.tokens_by_jti.setdefault(claims['jti'], set()).add(token)
+            while len(self.entries) > maxsize:
+                self._remove(next(iter(self.entries)))
+
+    def revoke(self, jti):
+        """Drop every cached token with the given jti"""
+        with self.lock:
+            for token in list(self.tokens_by_jti.get(jti, ())):
+                self._remove(token)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tokens_by_jti.clear()
+
+    def _remove(self, token):
+        claims = self.entries.pop(token)
+        tokens = self.tokens_by_jti.get(claims['jti'])
+        tokens.discard(token)
+        if not tokens:
+            del self.tokens_by_jti[claims['jti']]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+claims_cache = ClaimsCache()
+
+
+def raw_token():
+    """Return the raw token sent in the authorization header or None"""
+    header = request.headers.get(
+        current_app.config.get('JWT_HEADER_NAME', 'Authorization'), '')
+    header_type = current_app.config.get('JWT_HEADER_TYPE', 'Bearer')
+    parts = header.split()
+    if header_type and len(parts) == 2 and parts[0] == header_type:
+        return parts[1]
+    if not header_type and len(parts) == 1:
+        return parts[0]
+    return None
+
+
+def remember_claims(fn):
+    """Cache the claims the library has just verified, then call fn
+
+    Decoding is over by then, so the jwt.decode span cached left in
+    g.jwt_decode_span is ended first.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        end_span(g.pop('jwt_decode_span', None))
+        token = raw_token()
+        claims = get_raw_jwt()
+        if token is not None and claims:
+            claims_cache.put(token, claims,
+                             current_app.config['JWT_CLAIMS_CACHE_SIZE'])
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+def cached(decorator):
+    """Wrap a flask_jwt_extended decorator with the claims cache"""
+    def decorate(fn):
+        verified = decorator(remember_claims(fn))
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span('jwt.cache'):
+                token = raw_token()
+                claims = None if token is None else claims_cache.get(token)
+            if claims is None:
+                decoding = g.jwt_decode_span = start_span('jwt.decode')
+                try:
+                    return verified(*args, **kwargs)
+                finally:
+                    g.pop('jwt_decode_span', None)
+                    end_span(decoding)
+            ctx_stack.top.jwt = claims
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+jwt_required = cached(flask_jwt_extended.jwt_required)
+jwt_optional = cached(flask_jwt_extended.jwt_optional)
+
+
+def create_token_pair(identity, expires):
+    """Return a new refresh token and an access token paired with it"""
+    refresh_token = create_refresh_token(identity=identity)
+    claims = decode_token(refresh_token)
+    track_refresh_token(identity, claims['jti'], claims['exp'])
+    oplog.record('refresh.issued', {'identity': identity,
+                                    'jti': claims['jti'],
+                                    'exp': claims['exp']})
+    access_token = create_paired_access_token(identity, claims['jti'],
+                                              expires)
+    return access_token, refresh_token
+
+
+def track_refresh_token(identity, jti, exp):
+    """Remember a refresh token so that it can be revoked later"""
+    active = refresh_tokens.setdefault(identity, {})
+    now = time.time()
+    for expired in [old for old, old_exp in active.items()
+                    if old_exp <= now]:
+        del active[expired]
+    active[jti] = exp
+
+
+def create_paired_access_token(identity, refresh_jti, expires):
+    """Return an access token carrying the jti of its refresh token"""
+    g.refresh_jti = refresh_jti
+    try:
+        return create_access_token(identity=identity, expires_delta=expires)
+    finally:
+        g.pop('refresh_jti', None)
+
+
+def paired_refresh_claims(identity):
+    """user_claims_loader adding the paired refresh jti to access tokens"""
+    refresh_jti = g.get('refresh_jti')
+    if refresh_jti is None:
+        return {}
+    return {'refresh_jti': refresh_jti}
+
+
+def revoke_refresh_token(identity, jti):
+    """Forget one refresh token and return its jti for blacklisting"""
+    refresh_tokens.get(identity, {}).pop(jti, None)
+    return jti
+
+
+def revoke_refresh_tokens(identity):
+    """Forget every refresh token of identity and return their jtis"""
+    return list(refresh_tokens.pop(identity, {}))
@@ -1,17 +1,45 @@
+import datetime
 from flask import Blueprint, request, jsonify
 from flask.views import MethodView
-from flask_jwt_extended import get_raw_jwt, jwt_required, get_jwt_identity
+from flask_jwt_extended import (get_raw_jwt, get_jwt_identity,
+                                get_jwt_claims, jwt_refresh_token_required)
 from flask_bcrypt import Bcrypt
 from app.models import User
 from app.baseview import BaseView
+from app.idempotency import idempotent
+from app.admission import admitted
+from app.auth.tokens import (jwt_required, claims_cache,
+                             create_paired_access_token,
+                             revoke_refresh_token, revoke_refresh_tokens)
+from app.replication.log import oplog
+from app.tracing import span
 
 auth = Blueprint('auth', __name__, url_prefix='/api/v1')
 users = []
 blacklist = set()
 
 
+def revoke_tokens(jtis):
+    """Blacklist the jtis here and on every peer"""
+    jtis = list(jtis)
+    blacklist.update(jtis)
+    for jti in jtis:
+        claims_cache.revoke(jti)
+    if jtis:
+        oplog.record('token.revoked', {'jtis': jtis})
+
+
+def record_password(user):
+    """Replicate the new password hash of a user"""
+    oplog.record('user.password_changed',
+                 {'email': user.email, 'password_hash': user.password},
+                 key=('user', user.email))
+
+
 class RegisterUser(BaseView):
     """Method to Register a new user"""
+    @idempotent
+    @admitted('hashing')
     def post(self):
         """Endpoint to save the data to the database"""
         if self.validate_json():
@@ -37,18 +65,25 @@ class RegisterUser(BaseView):
         norm_name = self.remove_extra_spaces(name=username)
         username = norm_name['name']
 
-        emails = [user.email for user in users]
+        with span('store.users'):
+            emails = [user.email for user in users]
         if email in emails:
             response = {'message': 'User already exists. Please login'}
             return jsonify(response), 409
-        user = User(email, username, password)
+        with span('bcrypt.hash'):
+            user = User(email, username, password)
         users.append(user)
+        oplog.record('user.registered',
+                     {'email': email, 'username': username,
+                      'password_hash': user.password},
+                     key=('user', email))
         response = {'message': 'Account created successfully'}
         return jsonify(response), 201
 
 
 class LoginUser(BaseView):
     """Method to Login a user"""
+    @admitted('hashing')
     def post(self):
         """Endpoint to save the data to the database"""
         if self.validate_json():
@@ -61,9 +96,12 @@ class LoginUser(BaseView):
         if self.validate_null(**user_data):
             return self.validate_null(**user_data)
 
-        user_ = [user for user in users
-                 if user.email == email and
-                 Bcrypt().check_password_hash(user.password, password)]
+        with span('store.users'):
+            candidates = [user for user in users if user.email == email]
+        with span('bcrypt.check'):
+            user_ = [user for user in candidates
+                     if Bcrypt().check_password_hash(user.password,
+                                                     password)]
 
         if not user_:
             response = {'message': 'Invalid email or password'}
@@ -77,14 +115,20 @@ class LogoutUser(MethodView):
     @jwt_required
     def post(self):
         """Endpoint to logout a user"""
-        jti = get_raw_jwt()['jti']
-        blacklist.add(jti)
+        jtis = [get_raw_jwt()['jti']]
+        refresh_jti = get_jwt_claims().get('refresh_jti')
+        if refresh_jti is not None:
+            jtis.append(revoke_refresh_token(get_jwt_identity(),
+                                             refresh_jti))
+        revoke_tokens(jtis)
         response = {'message': 'Successfully logged out'}
         return jsonify(response), 200
 
 
 class ResetPassword(BaseView):
     """Method to reset a user password"""
+    @idempotent
+    @admitted('hashing')
     def post(self):
         """Endpoint to reset a user password"""
         if self.validate_json():
@@ -101,7 +145,10 @@ class ResetPassword(BaseView):
         for user in users:
             if user.email == email:
                 password = self.random_string()
-                user.update_password(password)
+                with span('bcrypt.hash'):
+                    user.update_password(password)
+                record_password(user)
+                revoke_tokens(revoke_refresh_tokens(email))
                 self.send_reset_password(email, password)
                 response = {'message': 'Password reset successfull.' +
                                        ' Check your email for your' +
@@ -114,6 +161,7 @@ class ResetPassword(BaseView):
 class ChangePassword(BaseView):
     """Method to change a user password"""
     @jwt_required
+    @admitted('hashing')
     def put(self):
         """Endpoint to change a user password"""
         if self.validate_json():
@@ -129,23 +177,49 @@ class ChangePassword(BaseView):
         if self.validate_null(**user_data):
             return self.validate_null(**user_data)
 
-        user_ = [user for user in users if user.email == current_user]
+        with span('store.users'):
+            user_ = [user for user in users if user.email == current_user]
         if not user_:
             response = {'message': 'The user is not registered'}
             return jsonify(response), 401
         user = user_[0]
-        if not Bcrypt().check_password_hash(user.password, old_pass):
+        with span('bcrypt.check'):
+            correct = Bcrypt().check_password_hash(user.password, old_pass)
+        if not correct:
             response = {'message': 'The initial password is not correct'}
             return jsonify(response), 401
         for usr in users:
             if current_user == usr.email:
-                usr.update_password(new_pass)
-                blacklist.add(jti)
+                with span('bcrypt.hash'):
+                    usr.update_password(new_pass)
+                record_password(usr)
+                revoke_tokens([jti] + revoke_refresh_tokens(current_user))
                 response = {'message': 'Password change successfull' +
                                        ' Login to continue'}
         return jsonify(response), 201
 
 
+class RefreshToken(BaseView):
+    """Method to issue a new access token from a refresh token"""
+    @jwt_refresh_token_required
+    def post(self):
+        """Endpoint to refresh an access token without the password"""
+        current_user = get_jwt_identity()
+        with span('store.users'):
+            user_ = [user for user in users if user.email == current_user]
+        if not user_:
+            response = {'message': 'The user is not registered'}
+            return jsonify(response), 401
+        refresh_jti = get_raw_jwt()['jti']
+        response = {
+            'message': 'Token refreshed successfully',
+            'access_token': create_paired_access_token(
+                current_user, refresh_jti,
+                expires=datetime.timedelta(hours=1))
+        }
+        return jsonify(response), 200
+
+
 auth.add_url_rule('/register', view_func=RegisterUser.as_view('register'))
 auth.add_url_rule('/login', view_func=LoginUser.as_view('login'))
 auth.add_url_rule('/logout', view_func=LogoutUser.as_view('logout'))
@@ -153,3 +227,5 @@ auth.add_url_rule('/reset-password',
                   view_func=ResetPassword.as_view('reset-password'))
 auth.add_url_rule('/change-password',
                   view_func=ChangePassword.as_view('Change-password'))
+auth.add_url_rule('/token/refresh',
+                  view_func=RefreshToken.as_view('token-refresh'))
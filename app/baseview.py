@@ -1,17 +1,19 @@
 import re
 import datetime
 import uuid
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from flask.views import MethodView
-from flask_jwt_extended import create_access_token
 from email_validator import validate_email, EmailNotValidError
 from flask_mail import Message
 from app import mail
+from app.auth.tokens import create_token_pair
+from app.tracing import span, traced
 
 
 class BaseView(MethodView):
     """Base view method"""
     @staticmethod
+    @traced('validate.json')
     def validate_json():
         """Returns false if request is json"""
         if request.get_json(silent=True) is None:
@@ -20,6 +22,7 @@ class BaseView(MethodView):
         return False
 
     @staticmethod
+    @traced('validate.email')
     def check_email(email):
         try:
             validator_response = validate_email(email,
@@ -31,6 +34,7 @@ class BaseView(MethodView):
             return jsonify(response), 400
 
     @staticmethod
+    @traced('validate.null')
     def validate_null(**kwargs):
         """Returns a list with null fields"""
         messages = []
@@ -52,11 +56,13 @@ class BaseView(MethodView):
     @staticmethod
     def generate_token(user, username,
                        expires=datetime.timedelta(hours=1)):
-        """Return access token and response to user"""
+        """Return access and refresh tokens and response to user"""
+        with span('jwt.encode'):
+            access_token, refresh_token = create_token_pair(user, expires)
         response = {
             'message': f'Login successfull. Welcome {username}',
-            'access_token': create_access_token(identity=user,
-                                                expires_delta=expires)
+            'access_token': access_token,
+            'refresh_token': refresh_token
         }
         return jsonify(response), 200
 
@@ -68,6 +74,7 @@ class BaseView(MethodView):
         return random[:string_length]
 
     @staticmethod
+    @traced('validate.spaces')
     def remove_extra_spaces(**kwargs):
         """Maximum number of spaces between words should be one"""
         norm = {}
@@ -85,9 +92,11 @@ class BaseView(MethodView):
             recipients=[email],
             html=f'Your new password is: {password}'
         )
-        mail.send(message)
+        with span('mail'):
+            mail.send(message)
 
     @staticmethod
+    @traced('validate.normalize_email')
     def normalize_email(email):
         """Lowercase the domain part of the email"""
         email_part = email.split('@')
@@ -96,6 +105,7 @@ class BaseView(MethodView):
         return email
 
     @staticmethod
+    @traced('validate.password')
     def check_password(password):
         if re.match(r"(?=\D*\d)(?=[^A-Z]*[A-Z])(?=[^a-z]*[a-z])[A-Za-z0-9]{8,}$", password):
             return False
@@ -103,3 +113,12 @@ class BaseView(MethodView):
                                'characters with at least one digit, one ' +
                                'uppercase letter and one lowercase letter'}
         return jsonify(response), 400
+
+    @staticmethod
+    def check_admin(email):
+        """Returns false if the user is an administrator"""
+        if email in current_app.config['ADMINS']:
+            return False
+        response = {'message': 'The operation is forbidden for' +
+                               ' non administrators'}
+        return jsonify(response), 403
@@ -0,0 +1,111 @@
+"""Secondary indexes over the business store, kept up to date by
+    publish_change
+"""
+import re
+import threading
+from bisect import bisect_left, insort
+from itertools import islice
+
+
+def normalize_name(name):
+    """Lowercase a name and collapse its whitespace"""
+    return re.sub(r'\s+', ' ', name.strip()).lower()
+
+
+class NameIndex():
+    """Sorted index of normalized business names for prefix lookups"""
+    def __init__(self):
+        self.keys = []
+        self.key_by_id = {}
+        self.businesses = {}
+        self.lock = threading.Lock()
+
+    def add(self, business):
+        """Index a new or renamed business"""
+        with self.lock:
+            self._discard(business.id)
+            key = (normalize_name(business.name), business.id)
+            insort(self.keys, key)
+            self.key_by_id[business.id] = key
+            self.businesses[business.id] = business
+
+    def remove(self, business_id):
+        with self.lock:
+            self._discard(business_id)
+
+    def _discard(self, business_id):
+        key = self.key_by_id.pop(business_id, None)
+        if key is not None:
+            del self.keys[bisect_left(self.keys, key)]
+            del self.businesses[business_id]
+
+    def prefixed(self, prefix, limit):
+        """Return up to limit businesses whose name starts with prefix
+
+        Takes O(log n + limit) time.
+        """
+        prefix = normalize_name(prefix)
+        with self.lock:
+            start = bisect_left(self.keys, (prefix,))
+            matches = []
+            for name, business_id in self.keys[start:start + limit]:
+                if not name.startswith(prefix):
+                    break
+                matches.append(self.businesses[business_id])
+            return matches
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+            self.key_by_id.clear()
+            self.businesses.clear()
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class OwnerIndex():
+    """Businesses by id and by owner, in creation order"""
+    def __init__(self):
+        self.businesses = {}
+        self.by_owner = {}
+        self.lock = threading.Lock()
+
+    def add(self, business):
+        with self.lock:
+            self.businesses[business.id] = business
+            owned = self.by_owner.setdefault(business.created_by, {})
+            owned[business.id] = business
+
+    def remove(self, business_id):
+        with self.lock:
+            business = self.businesses.pop(business_id, None)
+            if business is None:
+                return
+            owned = self.by_owner[business.created_by]
+            del owned[business_id]
+            if not owned:
+                del self.by_owner[business.created_by]
+
+    def find(self, business_id):
+        """Return the business with business_id or None"""
+        return self.businesses.get(business_id)
+
+    def owned(self, owner, offset, limit):
+        """Return (total, page) of the businesses created by owner"""
+        with self.lock:
+            owned = self.by_owner.get(owner, {})
+            return len(owned), list(islice(owned.values(), offset,
+                                           offset + limit))
+
+    def clear(self):
+        with self.lock:
+            self.businesses.clear()
+            self.by_owner.clear()
+
+    def __len__(self):
+        return len(self.businesses)
+
+
+names = NameIndex()
+owners = OwnerIndex()
@@ -0,0 +1,129 @@
+"""Write-behind ingestion of reviews
+
+With REVIEWS_ASYNC set, a validated review is put on a bounded queue and
+answered with 202 and a review id instead of being written by the
+request thread. One background applier commits queued reviews to the
+store in batches, publishing each batch under a single acquisition of
+the change lock, and records when each one became visible, so write
+latency stays flat during review bursts.
+"""
+import logging
+import threading
+import uuid
+from collections import OrderedDict, deque
+from app.business.indexes import owners
+
+QUEUED, VISIBLE, REJECTED = 'queued', 'visible', 'rejected'
+logger = logging.getLogger(__name__)
+
+
+class ReviewQueue():
+    """Bounded queue of accepted reviews and the status of each"""
+    def __init__(self, maxsize=10000, batch_size=100, status_size=100000):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.status_size = status_size
+        self.queue = deque()
+        self.statuses = OrderedDict()
+        self.applying = 0
+        self.condition = threading.Condition()
+        self.thread = None
+        self.app = None
+
+    def init_app(self, app):
+        self.maxsize = app.config['REVIEW_QUEUE_SIZE']
+        self.batch_size = app.config['REVIEW_BATCH_SIZE']
+        self.status_size = app.config['REVIEW_STATUS_SIZE']
+        self.app = app
+
+    def submit(self, business_id, review, reviewed_by):
+        """Queue a review and return its id, or None if the queue is full"""
+        with self.condition:
+            if len(self.queue) >= self.maxsize:
+                return None
+            review_id = uuid.uuid4().hex
+            self.queue.append((review_id, business_id, review, reviewed_by))
+            self.statuses[review_id] = {'review_id': review_id,
+                                        'business_id': business_id,
+                                        'reviewed_by': reviewed_by,
+                                        'status': QUEUED}
+            while len(self.statuses) > self.status_size:
+                self.statuses.popitem(last=False)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, daemon=True,
+                                               name='review-applier')
+                self.thread.start()
+            self.condition.notify_all()
+            return review_id
+
+    def status(self, review_id):
+        """Return a copy of the status of a review or None if unknown"""
+        with self.condition:
+            status = self.statuses.get(review_id)
+            return dict(status) if status is not None else None
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                batch = [self.queue.popleft() for _ in
+                         range(min(self.batch_size, len(self.queue)))]
+                self.applying = len(batch)
+            try:
+                with self.app.app_context():
+                    self.commit(batch)
+            except Exception:
+                logger.exception('Committing %s reviews failed', len(batch))
+            finally:
+                with self.condition:
+                    self.applying = 0
+                    self.condition.notify_all()
+
+    def commit(self, batch):
+        """Append a batch of reviews to their businesses and publish them"""
+        from app.business.views import publish_changes
+        accepted, published = [], []
+        for review_id, business_id, review, reviewed_by in batch:
+            business = owners.find(business_id)
+            if business is None:
+                self.finish(review_id, REJECTED,
+                            message=f'The business with id {business_id}' +
+                                    ' is not available')
+                continue
+            business.reviews.append(review)
+            accepted.append((review_id, business_id))
+            published.append(('review.created', business_id, business,
+                              {'business_id': business_id, 'review': review,
+                               'reviewed_by': reviewed_by}))
+        versions = publish_changes(published)
+        for (review_id, business_id), version in zip(accepted, versions):
+            if version is None:
+                self.finish(review_id, REJECTED,
+                            message=f'The business with id {business_id}' +
+                                    ' is not available')
+            else:
+                self.finish(review_id, VISIBLE, version=version)
+
+    def finish(self, review_id, status, **details):
+        with self.condition:
+            entry = self.statuses.get(review_id)
+            if entry is not None:
+                entry.update(details, status=status)
+
+    def join(self, timeout=None):
+        """Wait until every queued review is committed, False on timeout"""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self.queue and not self.applying, timeout)
+
+    def clear(self):
+        with self.condition:
+            self.queue.clear()
+            self.statuses.clear()
+
+    def __len__(self):
+        return len(self.queue)
+
+
+review_queue = ReviewQueue()
@@ -1,20 +1,97 @@
 """Contains views to register, login reset password and logout user"""
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, jwt_optional
+import threading
+from flask import Blueprint, request, jsonify, Response, current_app
+from flask import stream_with_context
+from flask.views import MethodView
+from flask_jwt_extended import get_jwt_identity
 from flask_bcrypt import Bcrypt
 from app.models import Business
 from app.baseview import BaseView
+from app.auth.tokens import jwt_required, jwt_optional
+from app.events import events
+from app.idempotency import idempotent
+from app.coalesce import coalesced
+from app.admission import admitted
+from app.business.indexes import names, owners
+from app.business.ingest import review_queue
+from app.replication.log import oplog
+from app.tracing import span, traced
+from app.analytics import analytics
+from app.changes import changes
 from app.auth.views import users
 
 biz = Blueprint('biz', __name__, url_prefix='/api/v1/businesses')
 rev = Blueprint('rev', __name__,
                 url_prefix='/api/v1/businesses/<int:business_id>/reviews')
 store = []
+EVENT_FIELDS = ['business_id', 'business_name', 'category', 'location']
+MAX_AUTOCOMPLETE = 50
+MAX_PER_PAGE = 100
+change_lock = threading.Lock()
+
+
+def replicate_change(event, business_id, business, data):
+    """Record a local change to a business in the replication log"""
+    args, key = dict(data), None
+    if event != 'review.created':
+        key = ('business', business_id)
+    if event in ('business.created', 'business.updated'):
+        args['created_by'] = business.created_by
+    oplog.record(event, args, key=key)
+
+
+def apply_change(event, business_id, business, data):
+    """Index and version a change, the caller holding change_lock
+
+    Updates and reviews of a business deleted since it was looked up are
+    dropped and return None.
+    """
+    if event in ('business.updated', 'review.created') and \
+            owners.find(business_id) is not business:
+        return None
+    if business is None:
+        names.remove(business_id)
+        owners.remove(business_id)
+    elif event != 'review.created':
+        names.add(business)
+        owners.add(business)
+    analytics.record(event, business_id, business, data)
+    version = events.publish(event, {key: value for key, value in
+                                     data.items() if key != 'reviewed_by'})
+    changes.record(business_id, version, business)
+    return version
+
+
+@traced('store.publish')
+def publish_change(event, business_id, business=None, data=None,
+                   replicate=True):
+    """Index and version a change to a business and publish it to the
+        change feed and, unless it came from a peer, to the replication log
+    """
+    if data is None:
+        data = business.serialize(EVENT_FIELDS)
+    if replicate:
+        replicate_change(event, business_id, business, data)
+    with change_lock:
+        return apply_change(event, business_id, business, data)
+
+
+@traced('store.publish')
+def publish_changes(batch):
+    """Publish a batch of (event, business_id, business, data) changes
+        taking change_lock once, and return the version of each
+    """
+    for event, business_id, business, data in batch:
+        replicate_change(event, business_id, business, data)
+    with change_lock:
+        return [apply_change(event, business_id, business, data)
+                for event, business_id, business, data in batch]
 
 
 class BusinessManipulation(BaseView):
     """Method to manipulate business endpoints"""
     @jwt_required
+    @idempotent
     def post(self):
         if self.validate_json():
             return self.validate_json()
@@ -28,13 +105,16 @@ class BusinessManipulation(BaseView):
         if self.validate_null(**data_):
             return self.validate_null(**data_)
 
-        user_ = [user for user in users if current_user == user.email]
+        with span('store.users'):
+            user_ = [user for user in users if current_user == user.email]
         if not user_:
             response = {'message': 'Login in to register business'}
             return jsonify(response), 401
 
         data = self.remove_extra_spaces(**data_)
-        available = [business for business in store if data['name'] == business.name]
+        with span('store.scan'):
+            available = [business for business in store
+                         if data['name'] == business.name]
         if available:
             name = data['name']
             response = {'message': f'Business with name {name} already exists'}
@@ -42,6 +122,7 @@ class BusinessManipulation(BaseView):
 
         business = Business(**data, created_by=current_user)
         store.append(business)
+        publish_change('business.created', business.id, business)
         response = {'message': 'Business with name {} created'.format(name)}
         return jsonify(response), 201
 
@@ -58,25 +139,29 @@ class BusinessManipulation(BaseView):
         data_ = dict(name=name, category=category, location=location)
         if self.validate_null(**data_):
             return self.validate_null(**data_)
-        business_ = [business for business in store
-                     if business_id == business.id]
-        if not business_:
+        with span('store.find'):
+            business = owners.find(business_id)
+        if business is None:
             response = {'message': f'The business with id {business_id}' +
                         ' is not available'}
             return jsonify(response), 404
-        index = store.index(business_[0])
-        if current_user != store[index].created_by:
+        if current_user != business.created_by:
             response = {'message': 'The operation is forbidden' +
                         ' for this business'}
             return jsonify(response), 403
         data = self.remove_extra_spaces(**data_)
-        store[index].name = data['name']
-        store[index].category = data['category']
-        store[index].location = data['location']
+        business.name = data['name']
+        business.category = data['category']
+        business.location = data['location']
+        if publish_change('business.updated', business_id, business) is None:
+            response = {'message': f'The business with id {business_id}' +
+                        ' is not available'}
+            return jsonify(response), 404
         response = {'message': 'Business updated successfully'}
         return jsonify(response), 200
 
     @jwt_required
+    @admitted('hashing')
     def delete(self, business_id):
         if self.validate_json():
             return self.validate_json()
@@ -87,56 +172,127 @@ class BusinessManipulation(BaseView):
         if self.validate_null(**data_):
             return self.validate_null(**data_)
 
-        user_ = [user for user in users if current_user == user.email]
+        with span('store.users'):
+            user_ = [user for user in users if current_user == user.email]
         if not user_:
             response = {'message': 'Please login to delete business'}
             return jsonify(response), 401
 
         user = user_[0]
-        if not Bcrypt().check_password_hash(user.password, password):
+        with span('bcrypt.check'):
+            correct = Bcrypt().check_password_hash(user.password, password)
+        if not correct:
             response = {'message': 'Enter correct password to delete'}
             return jsonify(response), 401
 
-        business_ = [business for business in store
-                     if business_id == business.id]
-        if not business_:
+        with span('store.find'):
+            business = owners.find(business_id)
+        if business is None:
             response = {'message': f'The business with id {business_id}' +
                                    ' is not available'}
             return jsonify(response), 404
 
-        index = store.index(business_[0])
-        if current_user != store[index].created_by:
+        if current_user != business.created_by:
             response = {'message': 'The operation is forbidden' +
                                    ' for this business'}
             return jsonify(response), 403
-        del store[index]
+        with span('store.remove'):
+            store.remove(business)
+        publish_change('business.deleted', business_id,
+                       data={'business_id': business_id})
         response = {'message': f'Business with id {business_id} deleted'}
         return jsonify(response), 200
 
+    @staticmethod
+    def select_fields():
+        """Return the fields requested in ?fields= or None for all fields"""
+        fields = request.args.get('fields', None, type=str)
+        if fields is None:
+            return None
+        fields = [field.strip() for field in fields.split(',')
+                  if field.strip()]
+        return list(dict.fromkeys(fields))
+
+    @staticmethod
+    def validate_fields(fields):
+        """Returns false if all requested fields are known"""
+        if fields is None:
+            return False
+        unknown = [field for field in fields if field not in Business.fields]
+        if unknown or not fields:
+            allowed = ', '.join(Business.fields)
+            response = {'message': f'The fields should be one of {allowed}'}
+            return jsonify(response), 400
+        return False
+
+    @staticmethod
+    def owned_businesses(owner, fields):
+        """Return a page of the businesses created by the current user"""
+        current_user = get_jwt_identity()
+        if owner != 'me':
+            response = {'message': 'The owner should be me'}
+            return jsonify(response), 400
+        if current_user is None:
+            response = {'message': 'Please login to view your businesses'}
+            return jsonify(response), 401
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        if page < 1 or not 1 <= per_page <= MAX_PER_PAGE:
+            response = {'message': 'The page should be at least 1 and' +
+                                   ' per_page between 1 and' +
+                                   f' {MAX_PER_PAGE}'}
+            return jsonify(response), 400
+        with span('store.owned'):
+            total, owned = owners.owned(current_user, (page - 1) * per_page,
+                                        per_page)
+        with span('serialize'):
+            businesses = [business.serialize(fields) for business in owned]
+        response = {'businesses': businesses, 'page': page,
+                    'per_page': per_page, 'total': total}
+        with span('jsonify'):
+            return jsonify(response), 200
+
     @jwt_optional
+    @coalesced
     def get(self, business_id):
         """return a list of all businesses else a single business"""
         filter_by = request.args.get('category', 'all', type=str)
+        owner = request.args.get('owner', None, type=str)
+        fields = self.select_fields()
+        if self.validate_fields(fields):
+            return self.validate_fields(fields)
+        if business_id is None and owner is not None:
+            return self.owned_businesses(owner, fields)
         if business_id is None and filter_by == "all":
-            business_ = [business.serialize() for business in store]
+            with span('serialize'):
+                business_ = [business.serialize(fields) for business in store]
             if business_:
                 response = {'businesses': business_}
-                return jsonify(response), 200
+                with span('jsonify'):
+                    return jsonify(response), 200
             response = {'message': 'There are no businesses registered' +
                                    ' currently'}
             return jsonify(response), 202
         if business_id is None and filter_by != "all":
-            business_ = [business.serialize() for business in store
-                        if filter_by == business.category]
+            with span('store.scan'):
+                matched = [business for business in store
+                           if filter_by == business.category]
+            with span('serialize'):
+                business_ = [business.serialize(fields)
+                             for business in matched]
             if business_:
                 response = {'businesses': business_}
-                return jsonify(response), 200
+                with span('jsonify'):
+                    return jsonify(response), 200
             response = {'message': 'There are no businesses registered' +
                                    f' in {filter_by} category'}
             return jsonify(response), 202
         if business_id is not None:
-            business_ = [business.serialize() for business in store
-                         if business_id == business.id]
+            with span('store.find'):
+                business = owners.find(business_id)
+            with span('serialize'):
+                business_ = [] if business is None else \
+                    [business.serialize(fields)]
             if business_:
                 response = {'businesses': business_}
                 return jsonify(response), 200
@@ -148,6 +304,7 @@ class BusinessManipulation(BaseView):
 class ReviewManipulation(BaseView):
     """Method to manipulate business endpoints"""
     @jwt_required
+    @idempotent
     def post(self, business_id):
         """Endpoint to save the data to the database"""
         if self.validate_json():
@@ -161,25 +318,133 @@ class ReviewManipulation(BaseView):
         if self.validate_null(**data_):
             return self.validate_null(**data_)
 
-        business_ = [business for business in store
-                     if business_id == business.id]
-        if not business_:
+        with span('store.find'):
+            business = owners.find(business_id)
+        if business is None:
             response = {'message': f'The business with id {business_id}' +
                                    ' is not available'}
             return jsonify(response), 404
 
-        business = business_[0]
-        index = store.index(business_[0])
         if current_user == business.created_by:
             response = {'message': 'The operation is forbidden for' +
                                    ' own business'}
             return jsonify(response), 403
         data = self.remove_extra_spaces(**data_)
-        store[index].reviews.append(data['review'])
+        if current_app.config['REVIEWS_ASYNC']:
+            return self.queue_review(business_id, data['review'],
+                                     current_user)
+        business.reviews.append(data['review'])
+        version = publish_change('review.created', business_id, business,
+                                 data={'business_id': business_id,
+                                       'review': data['review'],
+                                       'reviewed_by': current_user})
+        if version is None:
+            response = {'message': f'The business with id {business_id}' +
+                                   ' is not available'}
+            return jsonify(response), 404
         response = {'message': 'Review for business with id' +
                                f' {business_id} created'}
         return jsonify(response), 201
 
+    @staticmethod
+    def queue_review(business_id, review, current_user):
+        """Accept a review for the background applier"""
+        review_id = review_queue.submit(business_id, review, current_user)
+        if review_id is None:
+            response = {'message': 'Too many reviews are waiting.' +
+                                   ' Please retry later'}
+            return jsonify(response), 503, {'Retry-After': '1'}
+        response = {'message': 'Review for business with id' +
+                               f' {business_id} accepted',
+                    'review_id': review_id}
+        location = f'{request.path}/{review_id}'
+        return jsonify(response), 202, {'Location': location}
+
+
+class ReviewStatus(BaseView):
+    """Method to report whether a queued review is visible"""
+    @jwt_required
+    def get(self, business_id, review_id):
+        """Endpoint to return the status of an accepted review"""
+        status = review_queue.status(review_id)
+        if status is None or status['business_id'] != business_id or \
+                status['reviewed_by'] != get_jwt_identity():
+            response = {'message': f'The review with id {review_id}' +
+                                   ' is not available'}
+            return jsonify(response), 404
+        return jsonify(status), 200
+
+
+class BusinessEvents(MethodView):
+    """Method to stream business and review changes"""
+    def get(self):
+        """Server-sent events feed resuming after Last-Event-ID
+
+        Every stream holds a worker thread, so at most
+        EVENTS_MAX_LISTENERS are open at a time.
+        """
+        if not events.listen(current_app.config['EVENTS_MAX_LISTENERS']):
+            response = {'message': 'Too many event streams are open.' +
+                                   ' Please retry later'}
+            return jsonify(response), 503, {'Retry-After': '5'}
+        last_id = request.headers.get('Last-Event-ID',
+                                      request.args.get('last_event_id'))
+        try:
+            last_id = int(last_id)
+        except (TypeError, ValueError):
+            last_id = events.last_id
+        heartbeat = current_app.config['EVENTS_HEARTBEAT']
+        stream = stream_with_context(events.stream(last_id, heartbeat))
+        response = Response(stream, mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.call_on_close(events.leave)
+        return response
+
+
+class BusinessChanges(BaseView):
+    """Method to sync the businesses changed since a version"""
+    def get(self):
+        """Return upserts and delete tombstones after ?since=<version>"""
+        since = request.args.get('since', 0, type=str)
+        if not str(since).isdigit():
+            response = {'message': 'The since parameter should be a' +
+                                   ' version number'}
+            return jsonify(response), 400
+        fields = BusinessManipulation.select_fields()
+        if BusinessManipulation.validate_fields(fields):
+            return BusinessManipulation.validate_fields(fields)
+        delta = changes.since(int(since))
+        if delta is None:
+            response = {'message': f'Changes since version {since} are no' +
+                                   ' longer available. Please resync',
+                        'version': changes.horizon}
+            return jsonify(response), 410
+        version, upserts, deletes = delta
+        response = {'version': version,
+                    'upserts': [business.serialize(fields)
+                                for business in upserts],
+                    'deletes': deletes}
+        return jsonify(response), 200
+
+
+class BusinessAutocomplete(BaseView):
+    """Method to suggest businesses by name prefix"""
+    def get(self):
+        """Return the first businesses whose name starts with ?prefix="""
+        prefix = request.args.get('prefix', None, type=str)
+        limit = request.args.get('limit', 10, type=int)
+        if self.validate_null(prefix=prefix):
+            return self.validate_null(prefix=prefix)
+        if not 1 <= limit <= MAX_AUTOCOMPLETE:
+            response = {'message': 'The limit should be between 1 and' +
+                                   f' {MAX_AUTOCOMPLETE}'}
+            return jsonify(response), 400
+        response = {'businesses': [
+            business.serialize(['business_id', 'business_name'])
+            for business in names.prefixed(prefix, limit)]}
+        return jsonify(response), 200
+
 
 business_view = BusinessManipulation.as_view('businesses')
 biz.add_url_rule('', defaults={'business_id': None},
@@ -190,5 +455,16 @@ biz.add_url_rule('/<int:business_id>', view_func=business_view,
 biz.add_url_rule('/<int:business_id>/reviews', view_func=business_view,
                  methods=['GET'])
 
+biz.add_url_rule('/events', view_func=BusinessEvents.as_view('events'),
+                 methods=['GET'])
+biz.add_url_rule('/changes', view_func=BusinessChanges.as_view('changes'),
+                 methods=['GET'])
+biz.add_url_rule('/autocomplete',
+                 view_func=BusinessAutocomplete.as_view('autocomplete'),
+                 methods=['GET'])
+
 review_view = ReviewManipulation.as_view('reviews')
 rev.add_url_rule('', view_func=review_view, methods=['POST'])
+rev.add_url_rule('/<review_id>',
+                 view_func=ReviewStatus.as_view('review-status'),
+                 methods=['GET'])
@@ -0,0 +1,78 @@
+"""Versioned log of business changes for delta sync
+
+Every business keeps only its latest change, ordered by version, so a
+client syncing since a version reads only the businesses changed after
+it. Deleted businesses leave a tombstone; the oldest tombstones are
+compacted away, and a client older than the compacted horizon must do
+a full resync.
+"""
+import threading
+from collections import OrderedDict, deque
+
+
+class ChangeLog():
+    """Latest version of every changed business, in version order"""
+    def __init__(self, tombstone_limit=1000):
+        self.entries = OrderedDict()
+        self.tombstones = deque()
+        self.tombstone_limit = tombstone_limit
+        self.horizon = 0
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.tombstone_limit = app.config['CHANGES_TOMBSTONE_LIMIT']
+
+    def record(self, business_id, version, business=None):
+        """Record a change, business is None when it was deleted
+
+        A deleted business stays deleted: later changes to it are ignored.
+        """
+        with self.lock:
+            self.version = max(self.version, version)
+            entry = self.entries.get(business_id)
+            if entry is not None and entry[1] is None:
+                return
+            self.entries.pop(business_id, None)
+            self.entries[business_id] = (version, business)
+            if business is None:
+                self.tombstones.append(business_id)
+                self.compact()
+
+    def compact(self):
+        """Drop the oldest tombstones beyond the limit"""
+        while len(self.tombstones) > self.tombstone_limit:
+            business_id = self.tombstones.popleft()
+            version, _ = self.entries.pop(business_id)
+            self.horizon = max(self.horizon, version)
+
+    def since(self, version):
+        """Return (version, upserts, deletes) after version
+
+        Returns None if tombstones after version were compacted away.
+        """
+        with self.lock:
+            if version < self.horizon:
+                return None
+            upserts, deletes = [], []
+            for business_id in reversed(self.entries):
+                changed, business = self.entries[business_id]
+                if changed <= version:
+                    break
+                if business is None:
+                    deletes.append(business_id)
+                else:
+                    upserts.append(business)
+            upserts.reverse()
+            deletes.reverse()
+            return self.version, upserts, deletes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.tombstones.clear()
+            self.horizon = 0
+            self.version = 0
+
+
+changes = ChangeLog()
@@ -0,0 +1,64 @@
+"""Single-flight coalescing of identical concurrent GET requests
+
+Requests for the same url at the same store version share one call of
+the view and one encoded response body. Requests whose response depends
+on the caller, such as ?owner=me, only share with the same caller.
+"""
+import threading
+from functools import wraps
+from flask import request, current_app
+from flask_jwt_extended import get_jwt_identity
+from app.changes import changes
+
+
+class Call():
+    """One in-flight view call and its response once done"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+class SingleFlight():
+    """Run a function once for concurrent callers with the same key"""
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Return (response, shared) for the call with key"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = Call()
+        if not leader:
+            call.done.wait()
+            if call.response is not None:
+                return call.response, True
+            return fn(), False
+        try:
+            call.response = fn()
+            return call.response, False
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+
+
+flights = SingleFlight()
+
+
+def coalesced(fn):
+    """Share the encoded response of identical concurrent GET requests"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        def encode():
+            response = current_app.make_response(fn(*args, **kwargs))
+            return (response.get_data(), response.status_code,
+                    list(response.headers))
+
+        identity = get_jwt_identity() if 'owner' in request.args else None
+        key = (request.full_path, identity, changes.version)
+        (data, status, headers), _ = flights.do(key, encode)
+        return current_app.response_class(data, status, headers)
+    return wrapper
@@ -0,0 +1,76 @@
+"""Accept-Encoding negotiated gzip/deflate compression of responses"""
+import zlib
+from flask import request, current_app
+
+WBITS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+
+
+def choose_encoding():
+    """Return the best encoding the client accepts or None"""
+    accepted = request.accept_encodings
+    listed = {value.lower() for value in accepted.values()}
+    best = None
+    best_quality = 0
+    for encoding in WBITS:
+        if encoding in listed:
+            quality = accepted[encoding]
+        else:
+            quality = accepted['*']
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compressor(encoding, level):
+    """Return a new incremental compressor for the encoding"""
+    return zlib.compressobj(level, zlib.DEFLATED, WBITS[encoding])
+
+
+def compress(data, encoding, level):
+    """Compress a whole body in one go"""
+    stream = compressor(encoding, level)
+    return stream.compress(data) + stream.flush()
+
+
+def compress_stream(chunks, encoding, level):
+    """Compress an iterable body chunk by chunk
+
+    Every chunk is sync-flushed so that a client reading a long-lived
+    stream receives each chunk as soon as it is produced.
+    """
+    stream = compressor(encoding, level)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode()
+        data = stream.compress(chunk) + stream.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield stream.flush()
+
+
+def compress_response(response):
+    """after_request hook compressing large or streamed responses"""
+    config = current_app.config
+    if not config['COMPRESS_ENABLED']:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code < 200 or response.status_code in (204, 304) or
+            'Content-Encoding' in response.headers or
+            response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+    level = config['COMPRESS_LEVEL']
+
+    if response.is_streamed:
+        response.response = compress_stream(response.response,
+                                            encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,90 @@
+"""In-memory change feed of business and review events
+
+Events are kept in a bounded ring buffer so that a client reconnecting
+with Last-Event-ID receives what it missed, as long as it is still in
+the buffer.
+"""
+import json
+import threading
+from collections import deque
+
+
+class EventLog():
+    """Bounded, ordered log of published events"""
+    def __init__(self, maxlen=1000):
+        self.buffer = deque(maxlen=maxlen)
+        self.last_id = 0
+        self.listeners = 0
+        self.condition = threading.Condition()
+
+    def init_app(self, app):
+        """Resize the ring buffer from the app configuration"""
+        with self.condition:
+            self.buffer = deque(self.buffer,
+                                maxlen=app.config['EVENTS_BUFFER_SIZE'])
+
+    def publish(self, event, data):
+        """Append an event, wake up listeners and return its id"""
+        with self.condition:
+            self.last_id += 1
+            self.buffer.append((self.last_id, event, data))
+            self.condition.notify_all()
+            return self.last_id
+
+    def since(self, last_id):
+        """Return the events after last_id, or None if some were dropped"""
+        with self.condition:
+            if last_id > self.last_id:
+                return None
+            if self.buffer and last_id < self.buffer[0][0] - 1:
+                return None
+            if not self.buffer and last_id < self.last_id:
+                return None
+            return [item for item in self.buffer if item[0] > last_id]
+
+    def listen(self, maxsize):
+        """Count a new stream, or return False if maxsize are open"""
+        with self.condition:
+            if self.listeners >= maxsize:
+                return False
+            self.listeners += 1
+            return True
+
+    def leave(self):
+        with self.condition:
+            self.listeners -= 1
+
+    def wait(self, last_id, timeout):
+        """Block until an event after last_id is published or timeout"""
+        with self.condition:
+            if self.last_id <= last_id:
+                self.condition.wait(timeout)
+
+    def stream(self, last_id, heartbeat):
+        """Yield server-sent events after last_id as they are published"""
+        while True:
+            items = self.since(last_id)
+            if items is None:
+                last_id = self.last_id
+                yield format_event(last_id, 'reset', {'last_id': last_id})
+                continue
+            for item in items:
+                last_id = item[0]
+                yield format_event(*item)
+            if not items:
+                yield ': keep-alive\n\n'
+            self.wait(last_id, heartbeat)
+
+    def clear(self):
+        with self.condition:
+            self.buffer.clear()
+            self.last_id = 0
+            self.listeners = 0
+
+
+def format_event(event_id, event, data):
+    """Return one event in the text/event-stream format"""
+    return f'id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+events = EventLog()
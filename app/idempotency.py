@@ -0,0 +1,147 @@
+"""Idempotency-Key support for POST endpoints
+
+The first response for a key and user is kept in a bounded cache that
+evicts the least recently used entries and those older than the ttl.
+Retries with the same key replay it; a retry arriving while the first
+request is still running waits for it instead of running again.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+
+MAX_KEY_LENGTH = 255
+
+
+class Entry():
+    """A response for one key, pending until done is set"""
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.created = time.time()
+        self.done = threading.Event()
+        self.response = None
+
+
+class IdempotencyCache():
+    """Bounded, ttl evicting cache of responses per idempotency key"""
+    def __init__(self, maxsize=10000, ttl=86400):
+        self.entries = OrderedDict()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config['IDEMPOTENCY_CACHE_SIZE']
+        self.ttl = app.config['IDEMPOTENCY_TTL']
+
+    def begin(self, key, fingerprint):
+        """Return (entry, True) for a new key, else the existing entry"""
+        with self.lock:
+            expired = time.time() - self.ttl
+            entry = self.entries.get(key)
+            if entry is not None and entry.created > expired:
+                self.entries.move_to_end(key)
+                return entry, False
+            self.entries.pop(key, None)
+            self.evict(expired)
+            entry = Entry(fingerprint)
+            self.entries[key] = entry
+            return entry, True
+
+    def finish(self, key, entry, response):
+        """Store the response, or forget the key if response is None"""
+        entry.response = response
+        if response is None:
+            with self.lock:
+                if self.entries.get(key) is entry:
+                    del self.entries[key]
+        entry.done.set()
+
+    def evict(self, expired):
+        """Make room for one entry, dropping expired ones on the way"""
+        while self.entries:
+            key, entry = next(iter(self.entries.items()))
+            if len(self.entries) < self.maxsize and entry.created > expired:
+                break
+            del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+idempotency = IdempotencyCache()
+
+
+def idempotent(fn):
+    """Replay the first response of a request sent with Idempotency-Key"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key is None:
+            return fn(*args, **kwargs)
+        if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+            response = {'message': 'The Idempotency-Key should have 1 to' +
+                                   f' {MAX_KEY_LENGTH} characters'}
+            return jsonify(response), 400
+        key = (client(), request.method, request.path, idempotency_key)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        while True:
+            entry, new = idempotency.begin(key, fingerprint)
+            if new:
+                return run(fn, key, entry, *args, **kwargs)
+            if entry.fingerprint != fingerprint:
+                response = {'message': 'The Idempotency-Key was used with' +
+                                       ' a different request'}
+                return jsonify(response), 422
+            wait = current_app.config['IDEMPOTENCY_WAIT']
+            if not entry.done.wait(wait):
+                response = {'message': 'A request with this Idempotency-Key' +
+                                       ' is still in progress'}
+                return jsonify(response), 409
+            if entry.response is not None:
+                return replay(entry.response)
+    return wrapper
+
+
+def client():
+    """Return who the key belongs to: the user, or for anonymous routes
+        the remote address and the email in the body
+    """
+    identity = get_jwt_identity()
+    if identity is not None:
+        return identity
+    data = request.get_json(silent=True)
+    email = data.get('email') if isinstance(data, dict) else None
+    if isinstance(email, str):
+        email = email.strip().lower()
+    return (request.remote_addr, email)
+
+
+def run(fn, key, entry, *args, **kwargs):
+    """Run the first request for a key and keep its response"""
+    try:
+        response = current_app.make_response(fn(*args, **kwargs))
+    except Exception:
+        idempotency.finish(key, entry, None)
+        raise
+    if response.status_code >= 500:
+        idempotency.finish(key, entry, None)
+    else:
+        idempotency.finish(key, entry, (response.get_data(),
+                                        response.status_code,
+                                        list(response.headers)))
+    return response
+
+
+def replay(stored):
+    data, status, headers = stored
+    response = current_app.response_class(data, status, headers)
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
@@ -3,10 +3,12 @@ from flask_bcrypt import Bcrypt
 
 class User():
     """user contains an email, a username and a password"""
-    def __init__(self, email, username, password):
+    def __init__(self, email, username, password=None, password_hash=None):
         self.email = email
         self.username = username
-        self.password = Bcrypt().generate_password_hash(password).decode()
+        if password_hash is None:
+            password_hash = Bcrypt().generate_password_hash(password).decode()
+        self.password = password_hash
 
     def update_password(self, password):
         self.password = Bcrypt().generate_password_hash(password).decode()
@@ -18,23 +20,30 @@ class User():
 class Business():
     """contains the business model"""
     this_id = 0
-
-    def __init__(self, name, category, location, created_by):
-        Business.this_id += 1
-        self.id = Business.this_id
+    id_step = 1
+    fields = {'business_id': lambda biz: biz.id,
+              'business_name': lambda biz: biz.name,
+              'category': lambda biz: biz.category,
+              'location': lambda biz: biz.location,
+              'reviews': lambda biz: biz.reviews}
+
+    def __init__(self, name, category, location, created_by,
+                 business_id=None):
+        if business_id is None:
+            Business.this_id += Business.id_step
+            business_id = Business.this_id
+        self.id = business_id
         self.name = name
         self.category = category
         self.location = location
         self.created_by = created_by
         self.reviews = []
 
-    def serialize(self):
-        return {'business_id': self.id,
-                'business_name': self.name,
-                'category': self.category,
-                'location': self.location,
-                'reviews': self.reviews
-                }
+    def serialize(self, fields=None):
+        """Return a dict of the requested fields, all fields by default"""
+        if fields is None:
+            fields = Business.fields
+        return {field: Business.fields[field](self) for field in fields}
 
     def __repr__(self):
         return 'business is {}'.format(self.id)
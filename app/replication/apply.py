@@ -0,0 +1,127 @@
+"""Idempotent apply of operations pulled from peers
+
+An operation is applied at most once per origin and sequence number.
+Updates to the same business or user are resolved last writer wins on
+the (time, origin) stamp, so every node converges to the same state
+whatever the order operations arrive from different peers.
+"""
+import threading
+from app.auth.views import users, blacklist
+from app.auth.tokens import claims_cache, track_refresh_token
+from app.business.views import store, publish_change
+from app.business.indexes import owners
+from app.models import User, Business
+from app.replication.log import oplog
+
+apply_lock = threading.Lock()
+
+
+def user_registered(args, stamp):
+    for user in users:
+        if user.email == args['email']:
+            if oplog.newer(('user', args['email']), stamp):
+                user.username = args['username']
+                user.password = args['password_hash']
+            return
+    users.append(User(args['email'], args['username'],
+                      password_hash=args['password_hash']))
+
+
+def user_password_changed(args, stamp):
+    if not oplog.newer(('user', args['email']), stamp):
+        return
+    for user in users:
+        if user.email == args['email']:
+            user.password = args['password_hash']
+
+
+def refresh_issued(args, stamp):
+    track_refresh_token(args['identity'], args['jti'], args['exp'])
+
+
+def token_revoked(args, stamp):
+    blacklist.update(args['jtis'])
+    for jti in args['jtis']:
+        claims_cache.revoke(jti)
+
+
+def advance_business_ids(business_id):
+    """Move the id counter past business_id, keeping this node's stride
+
+    A restarted node starts counting again from its first id; without
+    this it would hand out ids its peers already hold.
+    """
+    if business_id > Business.this_id:
+        steps = (business_id - Business.this_id) // Business.id_step
+        Business.this_id += steps * Business.id_step
+
+
+def business_created(args, stamp):
+    if owners.find(args['business_id']) is not None:
+        return
+    advance_business_ids(args['business_id'])
+    business = Business(args['business_name'], args['category'],
+                        args['location'], args['created_by'],
+                        business_id=args['business_id'])
+    store.append(business)
+    publish_change('business.created', business.id, business,
+                   replicate=False)
+
+
+def business_updated(args, stamp):
+    business = owners.find(args['business_id'])
+    if business is None or not oplog.newer(('business', business.id), stamp):
+        return
+    business.name = args['business_name']
+    business.category = args['category']
+    business.location = args['location']
+    publish_change('business.updated', business.id, business,
+                   replicate=False)
+
+
+def business_deleted(args, stamp):
+    business = owners.find(args['business_id'])
+    if business is None:
+        return
+    store.remove(business)
+    publish_change('business.deleted', business.id,
+                   data={'business_id': business.id}, replicate=False)
+
+
+def review_created(args, stamp):
+    business = owners.find(args['business_id'])
+    if business is None:
+        return
+    business.reviews.append(args['review'])
+    publish_change('review.created', business.id, business,
+                   data=dict(args), replicate=False)
+
+
+APPLIERS = {
+    'user.registered': (user_registered, 'user', 'email'),
+    'user.password_changed': (user_password_changed, 'user', 'email'),
+    'refresh.issued': (refresh_issued, None, None),
+    'token.revoked': (token_revoked, None, None),
+    'business.created': (business_created, 'business', 'business_id'),
+    'business.updated': (business_updated, 'business', 'business_id'),
+    'business.deleted': (business_deleted, 'business', 'business_id'),
+    'review.created': (review_created, None, None),
+}
+
+
+def apply(entry):
+    """Apply one log entry from a peer, return False if already applied"""
+    with apply_lock:
+        if oplog.seen(entry['origin'], entry['origin_seq']):
+            return False
+        applier, kind, id_field = APPLIERS[entry['op']]
+        applier(entry['args'], entry['stamp'])
+        key = None if kind is None else (kind, entry['args'][id_field])
+        deleted = entry['op'].endswith('.deleted')
+        if key is not None and not deleted and \
+                not oplog.newer(key, entry['stamp']):
+            key = None
+        oplog.record(entry['op'], entry['args'], key=key,
+                     origin=entry['origin'],
+                     origin_seq=entry['origin_seq'], stamp=entry['stamp'])
+        return True
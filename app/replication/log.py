@@ -0,0 +1,117 @@
+"""Ordered log of the mutations applied on this node
+
+Local mutations are recorded with this process as origin and the next
+local sequence number. The origin is the node id plus a per process
+epoch, because the sequence starts again at 1 on restart and peers
+would otherwise take the new operations for ones already applied.
+Operations pulled from peers are recorded with their own origin, so a
+node serves everything it has applied and peers need not be fully
+meshed. The log is a bounded ring buffer; a peer further behind than
+the buffer must be reseeded with a bulk import.
+"""
+import threading
+import time
+import uuid
+from collections import deque
+
+
+class OpLog():
+    """Bounded, ordered log of replicated operations"""
+    def __init__(self, maxlen=100000):
+        self.enabled = False
+        self.node_id = uuid.uuid4().hex
+        self.epoch = uuid.uuid4().hex
+        self.ops = deque(maxlen=maxlen)
+        self.seq = 0
+        self.local_seq = 0
+        self.applied = {}
+        self.stamps = {}
+        self.waiters = 0
+        self.condition = threading.Condition()
+
+    def init_app(self, app):
+        self.enabled = app.config['REPLICATION_ENABLED']
+        self.node_id = app.config['REPLICATION_NODE_ID'] or self.node_id
+        with self.condition:
+            self.ops = deque(self.ops,
+                             maxlen=app.config['REPLICATION_LOG_SIZE'])
+
+    def record(self, op, args, key=None, origin=None, origin_seq=None,
+               stamp=None):
+        """Append an operation, local unless origin is given"""
+        if not self.enabled:
+            return None
+        with self.condition:
+            if origin is None:
+                self.local_seq += 1
+                origin, origin_seq = self.origin, self.local_seq
+                stamp = [time.time(), self.node_id]
+            if key is not None:
+                if op.endswith('.deleted'):
+                    self.stamps.pop(key, None)
+                else:
+                    self.stamps[key] = stamp
+            self.seq += 1
+            entry = {'seq': self.seq, 'origin': origin,
+                     'origin_seq': origin_seq, 'op': op, 'args': args,
+                     'stamp': stamp}
+            self.ops.append(entry)
+            self.applied[origin] = origin_seq
+            self.condition.notify_all()
+            return entry
+
+    @property
+    def origin(self):
+        return f'{self.node_id}:{self.epoch}'
+
+    def seen(self, origin, origin_seq):
+        """Return True if the operation was already applied here"""
+        return self.applied.get(origin, 0) >= origin_seq
+
+    def newer(self, key, stamp):
+        """Return True if stamp wins over the last write to key"""
+        current = self.stamps.get(key)
+        return current is None or tuple(stamp) > tuple(current)
+
+    def since(self, seq, limit):
+        """Return up to limit entries after seq, or None if truncated"""
+        with self.condition:
+            if seq > self.seq:
+                return None
+            if self.ops and seq < self.ops[0]['seq'] - 1:
+                return None
+            if not self.ops and seq < self.seq:
+                return None
+            start = max(0, seq - self.ops[0]['seq'] + 1) if self.ops else 0
+            return [self.ops[index] for index in
+                    range(start, min(len(self.ops), start + limit))]
+
+    def first_seq(self):
+        with self.condition:
+            return self.ops[0]['seq'] if self.ops else self.seq + 1
+
+    def wait(self, seq, timeout, max_waiters):
+        """Block until an entry after seq is recorded or timeout
+
+        Returns at once when max_waiters requests are already waiting,
+        so long polls cannot take every worker thread.
+        """
+        with self.condition:
+            if self.seq > seq or self.waiters >= max_waiters:
+                return
+            self.waiters += 1
+            try:
+                self.condition.wait(timeout)
+            finally:
+                self.waiters -= 1
+
+    def clear(self):
+        with self.condition:
+            self.ops.clear()
+            self.seq = 0
+            self.local_seq = 0
+            self.applied.clear()
+            self.stamps.clear()
+
+
+oplog = OpLog()
@@ -0,0 +1,128 @@
+"""Background threads pulling the replication log of every peer"""
+import json
+import logging
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from flask import request, jsonify, current_app
+from app.models import Business
+from app.replication.apply import apply
+from app.replication.views import MAX_OPS
+
+logger = logging.getLogger(__name__)
+pullers = {}
+caught_up = threading.Event()
+catch_up = {'deadline': 0}
+
+
+class Puller(threading.Thread):
+    """Long-poll one peer and apply its operations in order"""
+    def __init__(self, app, peer):
+        super().__init__(name=f'replication-{peer}', daemon=True)
+        self.app = app
+        self.peer = peer.rstrip('/')
+        self.cursor = 0
+        self.caught_up = False
+        self.stopped = threading.Event()
+
+    def fetch(self):
+        config = self.app.config
+        wait = config['REPLICATION_POLL_WAIT'] if self.caught_up else 0
+        url = (f'{self.peer}/api/v1/replication/log?since={self.cursor}'
+               f'&wait={wait}')
+        req = Request(url, headers={
+            'X-Replication-Secret': config['REPLICATION_SECRET']})
+        timeout = config['REPLICATION_POLL_WAIT'] + 10
+        try:
+            with urlopen(req, timeout=timeout) as res:
+                return json.loads(res.read().decode())
+        except HTTPError as error:
+            if error.code != 410:
+                raise
+            body = json.loads(error.read().decode())
+            logger.warning('Peer %s no longer has operations after %s,'
+                           ' reseed this node with a bulk import',
+                           self.peer, self.cursor)
+            self.cursor = body['first_seq'] - 1
+            return {'ops': [], 'last_seq': self.cursor}
+
+    def run(self):
+        backoff = 1
+        while not self.stopped.is_set():
+            try:
+                body = self.fetch()
+                with self.app.app_context():
+                    for entry in body['ops']:
+                        apply(entry)
+                self.cursor = body['last_seq']
+                if len(body['ops']) < MAX_OPS and not self.caught_up:
+                    self.caught_up = True
+                    check_caught_up()
+                backoff = 1
+            except Exception:
+                logger.exception('Pulling from peer %s failed', self.peer)
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+    def stop(self):
+        self.stopped.set()
+
+
+def check_caught_up():
+    """Open local writes once every peer has been pulled up to date"""
+    if all(puller.caught_up for puller in pullers.values()):
+        caught_up.set()
+
+
+def hold_writes():
+    """Keep local writes waiting until the first catch up pull is done
+
+    A write accepted before could take a business id or a user a peer
+    already holds. Writes wait REPLICATION_CATCHUP_WAIT seconds and then
+    get a 503; after REPLICATION_CATCHUP_TIMEOUT unreachable peers are
+    given up on and writes are accepted.
+    """
+    if request.method in ('GET', 'HEAD', 'OPTIONS') or caught_up.is_set():
+        return None
+    if caught_up.wait(current_app.config['REPLICATION_CATCHUP_WAIT']):
+        return None
+    if time.time() >= catch_up['deadline']:
+        logger.warning('Peers are still not caught up, accepting writes')
+        caught_up.set()
+        return None
+    response = {'message': 'The node is catching up with its peers.' +
+                           ' Please retry later'}
+    return jsonify(response), 503, {'Retry-After': '1'}
+
+
+def init_app(app):
+    """Stride business ids by node, pull from every configured peer and
+        hold local writes until the peers are caught up
+
+    Node i of n allocates business ids i + 1, i + 1 + n, ... so that
+    businesses created on different nodes never share an id.
+    """
+    if Business.this_id <= 0:
+        Business.id_step = app.config['REPLICATION_NODE_COUNT']
+        Business.this_id = (app.config['REPLICATION_NODE_INDEX'] + 1 -
+                            Business.id_step)
+    catch_up['deadline'] = (time.time() +
+                            app.config['REPLICATION_CATCHUP_TIMEOUT'])
+    app.before_request(hold_writes)
+    start(app)
+    check_caught_up()
+
+
+def start(app):
+    """Start one puller per configured peer that is not pulled yet"""
+    for peer in app.config['REPLICATION_PEERS']:
+        if peer not in pullers:
+            pullers[peer] = Puller(app, peer)
+            pullers[peer].start()
+
+
+def stop():
+    for puller in pullers.values():
+        puller.stop()
+    pullers.clear()
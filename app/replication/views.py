@@ -0,0 +1,44 @@
+"""Contains the view peers pull the replication log from"""
+import hmac
+from flask import Blueprint, request, jsonify, current_app
+from flask.views import MethodView
+from app.replication.log import oplog
+
+replication = Blueprint('replication', __name__,
+                        url_prefix='/api/v1/replication')
+MAX_OPS = 1000
+MAX_WAIT = 30
+
+
+class ReplicationLog(MethodView):
+    """Method to read the replication log after a sequence number"""
+    def get(self):
+        """Endpoint returning log entries after ?since=, waiting for new
+            ones up to ?wait= seconds
+        """
+        secret = current_app.config['REPLICATION_SECRET']
+        given = request.headers.get('X-Replication-Secret', '')
+        if not oplog.enabled or not secret or \
+                not hmac.compare_digest(given, secret):
+            response = {'message': 'The operation is forbidden'}
+            return jsonify(response), 403
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', MAX_OPS, type=int), MAX_OPS)
+        wait = min(request.args.get('wait', 0, type=float), MAX_WAIT)
+        ops = oplog.since(since, limit)
+        if ops == [] and wait > 0:
+            oplog.wait(since, wait,
+                       current_app.config['REPLICATION_MAX_WAITERS'])
+            ops = oplog.since(since, limit)
+        if ops is None:
+            response = {'message': f'Operations after {since} are no' +
+                                   ' longer available',
+                        'node_id': oplog.node_id,
+                        'first_seq': oplog.first_seq()}
+            return jsonify(response), 410
+        response = {'node_id': oplog.node_id, 'ops': ops,
+                    'last_seq': ops[-1]['seq'] if ops else since}
+        return jsonify(response), 200
+
+
+replication.add_url_rule('/log', view_func=ReplicationLog.as_view('log'))
@@ -0,0 +1,170 @@
+"""Lightweight in-process request tracing
+
+Every request gets a trace id, returned in the X-Trace-Id header. A
+TRACE_SAMPLE_RATE fraction of requests is also traced: spans opened with
+`span` or `traced` while the request runs are nested under a root span
+for the request and the finished trace is handed to the exporter. Spans
+outside a sampled request cost one lookup and record nothing.
+"""
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from flask import request, current_app, g, has_app_context
+
+TRACE_HEADER = 'X-Trace-Id'
+TRACE_ID = re.compile(r'^[0-9a-f]{8,64}$')
+
+
+class Trace():
+    """The spans of one sampled request"""
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.stack = []
+
+    def start(self, name, attributes):
+        span = {'span_id': len(self.spans) + 1,
+                'parent_id': self.stack[-1]['span_id'] if self.stack
+                else None,
+                'name': name, 'start': time.time(), 'duration': None,
+                'attributes': attributes, 'started': time.perf_counter()}
+        self.spans.append(span)
+        self.stack.append(span)
+        return span
+
+    def end(self, span):
+        """End span and any span still open inside it"""
+        if not any(opened is span for opened in self.stack):
+            return
+        inner = None
+        while inner is not span:
+            inner = self.stack.pop()
+            inner['duration'] = time.perf_counter() - inner.pop('started')
+
+    def export(self):
+        return {'trace_id': self.trace_id, 'spans': self.spans}
+
+
+class InMemoryExporter():
+    """Keep the last maxlen traces"""
+    def __init__(self, maxlen=1000):
+        self.traces = deque(maxlen=maxlen)
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+    def clear(self):
+        self.traces.clear()
+
+
+class FileExporter():
+    """Append every trace as one JSON line to a file"""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace) + '\n'
+        with self.lock, open(self.path, 'a') as output:
+            output.write(line)
+
+
+class Tracer():
+    """Starts, samples and exports the trace of every request
+
+    TRACE_EXPORTER is 'memory', 'file' or any object with an export
+    method taking the trace as a dict.
+    """
+    def __init__(self):
+        self.exporter = InMemoryExporter()
+
+    def init_app(self, app):
+        exporter = app.config['TRACE_EXPORTER']
+        if exporter == 'memory':
+            exporter = InMemoryExporter(app.config['TRACE_BUFFER_SIZE'])
+        elif exporter == 'file':
+            exporter = FileExporter(app.config['TRACE_FILE'])
+        self.exporter = exporter
+
+    def start_request(self):
+        trace_id = request.headers.get(TRACE_HEADER, '').lower()
+        if not TRACE_ID.match(trace_id):
+            trace_id = uuid.uuid4().hex
+        g.trace_id = trace_id
+        if random.random() < current_app.config['TRACE_SAMPLE_RATE']:
+            g.trace = Trace(trace_id)
+            rule = request.url_rule.rule if request.url_rule else None
+            g.trace.start(f'{request.method} {rule or request.path}',
+                          {'path': request.path})
+
+    def finish_request(self, response):
+        response.headers[TRACE_HEADER] = g.trace_id
+        trace = g.get('trace')
+        if trace is not None and trace.spans:
+            trace.spans[0]['attributes']['status'] = response.status_code
+        return response
+
+    def end_request(self, error=None):
+        trace = g.pop('trace', None)
+        if trace is None or not trace.spans:
+            return
+        if error is not None:
+            trace.spans[0]['attributes']['error'] = type(error).__name__
+        trace.end(trace.spans[0])
+        self.exporter.export(trace.export())
+
+
+tracer = Tracer()
+
+
+def current_trace():
+    """Return the trace of the sampled request being handled or None"""
+    if not has_app_context():
+        return None
+    return g.get('trace')
+
+
+def start_span(name, **attributes):
+    """Open a span in the current trace and return it, or None"""
+    trace = current_trace()
+    if trace is None:
+        return None
+    return trace.start(name, attributes)
+
+
+def end_span(span):
+    """End a span opened with start_span, if it is still open"""
+    trace = current_trace()
+    if trace is not None and span is not None:
+        trace.end(span)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as a span of the current trace"""
+    opened = start_span(name, **attributes)
+    try:
+        yield opened
+    except Exception as error:
+        if opened is not None:
+            opened['attributes']['error'] = type(error).__name__
+        raise
+    finally:
+        end_span(opened)
+
+
+def traced(name):
+    """Time every call of the decorated function as a span"""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
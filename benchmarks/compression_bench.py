@@ -0,0 +1,55 @@
+"""Benchmark the CPU versus bytes tradeoff of response compression
+
+Usage: python benchmarks/compression_bench.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.business.views import store  # noqa: E402
+from app.models import Business  # noqa: E402
+
+SIZES = [10, 100, 1000, 10000]
+ENCODINGS = [('identity', None), ('gzip', 1), ('gzip', 6), ('gzip', 9),
+             ('deflate', 6)]
+REPEAT = 5
+
+
+def fill_store(size):
+    """Fill the store with size businesses with a couple of reviews each"""
+    store.clear()
+    for number in range(size):
+        business = Business(f'Business {number}', 'Food', 'Nairobi',
+                            'owner@test.com')
+        business.reviews.extend(['Great service', 'Would come again'])
+        store.append(business)
+
+
+def run():
+    app = create_app('testing')
+    client = app.test_client()
+    print(f'{"size":>7} {"encoding":>10} {"level":>5} '
+          f'{"bytes":>10} {"ratio":>6} {"ms":>8}')
+    for size in SIZES:
+        fill_store(size)
+        raw = None
+        for encoding, level in ENCODINGS:
+            if level is not None:
+                app.config['COMPRESS_LEVEL'] = level
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                res = client.get('/api/v1/businesses',
+                                 headers={'Accept-Encoding': encoding})
+            elapsed = (time.perf_counter() - start) / REPEAT * 1000
+            length = len(res.data)
+            raw = raw or length
+            print(f'{size:>7} {encoding:>10} {level or "-":>5} '
+                  f'{length:>10} {length / raw:>6.2f} {elapsed:>8.2f}')
+    store.clear()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,407 @@
+"""Scaling benchmark catching hot paths that quietly become O(n)
+
+Usage: python benchmarks/scaling_bench.py [--max-size 1000000]
+           [--compare benchmarks/results/<commit>.json]
+
+Every case is timed at store sizes from 10^2 to --max-size, growing the
+store of businesses and the list of users in place between sizes. The
+median time per call is fitted to constant, logarithmic, linear and
+n log n growth. The run fails when a case expected to be constant or
+logarithmic fits linear growth, or, with --compare, when a case is more
+than --tolerance times slower than in a previous run. Results are saved
+to benchmarks/results/<commit>.json.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from flask_bcrypt import Bcrypt  # noqa: E402
+from app import create_app  # noqa: E402
+from app.auth.tokens import create_token_pair  # noqa: E402
+from app.auth.views import users  # noqa: E402
+from app.baseview import BaseView  # noqa: E402
+from app.business.views import store  # noqa: E402
+from app.business.indexes import names, owners  # noqa: E402
+from app.models import User, Business  # noqa: E402
+
+RESULTS = os.path.join(ROOT, 'benchmarks', 'results')
+HEADER = {'Content-Type': 'application/json'}
+EMAIL = 'bench@test.com'
+PASSWORD = 'Test1234'
+NEW_PASSWORD = 'Test12345'
+OWNED = 10
+BATCH = 1000
+
+CONSTANT, LOG, LINEAR, NLOGN = 'constant', 'log n', 'n', 'n log n'
+MODELS = {CONSTANT: None, LOG: np.log, LINEAR: lambda n: n,
+          NLOGN: lambda n: n * np.log(n)}
+SUBLINEAR = (CONSTANT, LOG)
+MIN_GROWTH = 4.0
+CASES = []
+
+
+class Case():
+    """A hot path, the growth it should have and how to call it
+
+    Calls of pure functions are timed in batches of `batch` calls so
+    that timer noise does not drown microsecond costs.
+    """
+    def __init__(self, name, expected, prepare, max_size=None, batch=1):
+        self.name = name
+        self.expected = expected
+        self.prepare = prepare
+        self.max_size = max_size
+        self.batch = batch
+
+
+def case(name, expected, max_size=None, batch=1):
+    """Register a function returning a call to time against a Bench"""
+    def decorate(prepare):
+        CASES.append(Case(name, expected, prepare, max_size, batch))
+        return prepare
+    return decorate
+
+
+class Bench():
+    """An app with a store of businesses and users grown in place"""
+    def __init__(self):
+        self.app = create_app('testing')
+        self.app.extensions['mail'].default_sender = EMAIL
+        self.client = self.app.test_client()
+        self.password_hash = Bcrypt().generate_password_hash(
+            PASSWORD, 4).decode()
+        self.size = 0
+        self.counter = 0
+        users.append(User(EMAIL, 'bench', password_hash=self.password_hash))
+        self.changer = User('changer@test.com', 'changer',
+                            password_hash=self.password_hash)
+        users.append(self.changer)
+        for number in range(OWNED):
+            self.add_business(f'Bench {number}', 'IT', EMAIL)
+        self.owned = [business.id for business in store]
+
+    def grow(self, size):
+        """Add users and businesses until there are size of each"""
+        for number in range(self.size, size):
+            users.append(User(f'user{number}@test.com', 'user',
+                              password_hash=self.password_hash))
+            self.add_business(f'Business {number:07d}', 'Food',
+                              'filler@test.com')
+        self.size = size
+        gc.collect()
+
+    def add_business(self, name, category, owner):
+        business = Business(name, category, 'Nairobi', owner)
+        store.append(business)
+        names.add(business)
+        owners.add(business)
+        return business
+
+    def unique(self, prefix):
+        self.counter += 1
+        return f'{prefix} {self.counter}'
+
+    def tokens(self, email=EMAIL):
+        with self.app.app_context():
+            return create_token_pair(email, datetime.timedelta(hours=1))
+
+    def request(self, method, url, token=None, **data):
+        """Return a call sending the request, failing on error statuses"""
+        headers = dict(HEADER)
+        if token is not None:
+            headers['Authorization'] = 'Bearer ' + token
+        body = json.dumps(data) if data else None
+
+        def call():
+            res = getattr(self.client, method)(url, headers=headers,
+                                               data=body)
+            if res.status_code >= 400:
+                raise RuntimeError(f'{method.upper()} {url} returned' +
+                                   f' {res.status_code}: {res.data[:200]}')
+        return call
+
+
+@case('BaseView.validate_null', CONSTANT, batch=BATCH)
+def validate_null(bench):
+    return lambda: BaseView.validate_null(name='Andela', category='IT',
+                                          location='Nairobi')
+
+
+@case('BaseView.remove_extra_spaces', CONSTANT, batch=BATCH)
+def remove_extra_spaces(bench):
+    return lambda: BaseView.remove_extra_spaces(name='  Andela   Kenya ',
+                                                category='IT',
+                                                location=' Nairobi')
+
+
+@case('BaseView.check_email', CONSTANT, batch=BATCH)
+def check_email(bench):
+    return lambda: BaseView.check_email(EMAIL)
+
+
+@case('BaseView.check_password', CONSTANT, batch=BATCH)
+def check_password(bench):
+    return lambda: BaseView.check_password(PASSWORD)
+
+
+@case('BaseView.normalize_email', CONSTANT, batch=BATCH)
+def normalize_email(bench):
+    return lambda: BaseView.normalize_email('Bench@Test.COM')
+
+
+@case('Business()', CONSTANT, batch=BATCH)
+def business_model(bench):
+    return lambda: Business('Andela', 'IT', 'Nairobi', EMAIL)
+
+
+@case('User()', CONSTANT, batch=BATCH)
+def user_model(bench):
+    return lambda: User(EMAIL, 'bench', password_hash=bench.password_hash)
+
+
+@case('POST /businesses', LINEAR)
+def create_business(bench):
+    access, _ = bench.tokens()
+    return bench.request('post', '/api/v1/businesses', access,
+                         name=bench.unique('Posted'), category='IT',
+                         location='Nairobi')
+
+
+@case('GET /businesses', LINEAR, max_size=10 ** 5)
+def list_businesses(bench):
+    return bench.request('get', '/api/v1/businesses')
+
+
+@case('GET /businesses?category=', LINEAR)
+def filter_businesses(bench):
+    return bench.request('get', '/api/v1/businesses?category=IT')
+
+
+@case('GET /businesses?owner=me', CONSTANT)
+def owned_businesses(bench):
+    access, _ = bench.tokens()
+    return bench.request('get', '/api/v1/businesses?owner=me', access)
+
+
+@case('GET /businesses/<id>', CONSTANT)
+def get_business(bench):
+    return bench.request('get', f'/api/v1/businesses/{bench.owned[0]}')
+
+
+@case('GET /businesses/<id>/reviews', CONSTANT)
+def get_business_reviews(bench):
+    return bench.request('get',
+                         f'/api/v1/businesses/{bench.owned[0]}/reviews')
+
+
+@case('PUT /businesses/<id>', LOG)
+def update_business(bench):
+    access, _ = bench.tokens()
+    return bench.request('put', f'/api/v1/businesses/{bench.owned[0]}',
+                         access, name=bench.unique('Renamed'),
+                         category='IT', location='Nairobi')
+
+
+@case('DELETE /businesses/<id>', LINEAR)
+def delete_business(bench):
+    business = bench.add_business(bench.unique('Doomed'), 'IT', EMAIL)
+    access, _ = bench.tokens()
+    return bench.request('delete', f'/api/v1/businesses/{business.id}',
+                         access, password=PASSWORD)
+
+
+@case('POST /businesses/<id>/reviews', CONSTANT)
+def create_review(bench):
+    bench.app.config['REVIEWS_ASYNC'] = False
+    access, _ = bench.tokens(bench.changer.email)
+    return bench.request('post', f'/api/v1/businesses/{bench.owned[1]}'
+                         '/reviews', access, review='Lovely place')
+
+
+@case('POST /businesses/<id>/reviews async', CONSTANT)
+def queue_review(bench):
+    bench.app.config['REVIEWS_ASYNC'] = True
+    access, _ = bench.tokens(bench.changer.email)
+    return bench.request('post', f'/api/v1/businesses/{bench.owned[2]}'
+                         '/reviews', access, review='Lovely place')
+
+
+@case('GET /businesses/autocomplete', LOG)
+def autocomplete(bench):
+    return bench.request('get', '/api/v1/businesses/autocomplete'
+                         '?prefix=business 00&limit=10')
+
+
+@case('POST /register', LINEAR)
+def register(bench):
+    email = bench.unique('new').replace(' ', '') + '@test.com'
+    return bench.request('post', '/api/v1/register', email=email,
+                         username='new', password=PASSWORD)
+
+
+@case('POST /login', LINEAR)
+def login(bench):
+    return bench.request('post', '/api/v1/login', email=users[-1].email,
+                         password=PASSWORD)
+
+
+@case('POST /logout', CONSTANT)
+def logout(bench):
+    access, _ = bench.tokens()
+    return bench.request('post', '/api/v1/logout', access)
+
+
+@case('POST /reset-password', LINEAR)
+def reset_password(bench):
+    return bench.request('post', '/api/v1/reset-password',
+                         email=users[-1].email)
+
+
+@case('PUT /change-password', LINEAR)
+def change_password(bench):
+    bench.changer.password = bench.password_hash
+    access, _ = bench.tokens(bench.changer.email)
+    return bench.request('put', '/api/v1/change-password', access,
+                         old_password=PASSWORD, new_password=NEW_PASSWORD)
+
+
+@case('POST /token/refresh', LINEAR)
+def refresh(bench):
+    _, refresh_token = bench.tokens()
+    return bench.request('post', '/api/v1/token/refresh', refresh_token)
+
+
+def measure(bench, case_, repeat):
+    """Return the median seconds of one call, with gc paused"""
+    seconds = []
+    for _ in range(repeat):
+        call = case_.prepare(bench)
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            for _ in range(case_.batch):
+                call()
+            seconds.append((time.perf_counter() - start) / case_.batch)
+        finally:
+            gc.enable()
+    return float(np.median(seconds))
+
+
+def fit(sizes, seconds):
+    """Return the growth model with the least squared error
+
+    Times growing less than MIN_GROWTH times from the smallest to the
+    largest size are noise around a constant.
+    """
+    n = np.array(sizes, dtype=float)
+    t = np.array(seconds)
+    if t[n.argmax()] < MIN_GROWTH * t[n.argmin()]:
+        return CONSTANT
+    errors = {}
+    for model, growth in MODELS.items():
+        prediction = np.full_like(t, t.mean())
+        if growth is not None:
+            x = growth(n)
+            design = np.vstack([np.ones_like(x), x]).T
+            (intercept, slope), *_ = np.linalg.lstsq(design, t, rcond=None)
+            if slope > 0:
+                prediction = intercept + slope * x
+        errors[model] = float(((t - prediction) ** 2).sum())
+    return min(errors, key=errors.get)
+
+
+def commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              cwd=ROOT, check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, previous, tolerance):
+    """Return the cases that got slower than tolerance times previous"""
+    slower = []
+    for name, result in results['cases'].items():
+        before = previous['cases'].get(name, {}).get('seconds', {})
+        ratios = [result['seconds'][size] / before[size]
+                  for size in result['seconds'] if before.get(size)]
+        if not ratios:
+            continue
+        ratio = max(ratios)
+        print(f'{name:<38} {ratio:>6.2f}x {previous["commit"]}')
+        if ratio > tolerance:
+            slower.append(name)
+    return slower
+
+
+def run(args):
+    sizes = [10 ** power for power in range(2, 7)
+             if 10 ** power <= args.max_size]
+    cases = [case_ for case_ in CASES if args.only in case_.name]
+    bench = Bench()
+    seconds = {case_.name: {} for case_ in cases}
+    for size in sizes:
+        bench.grow(size)
+        for case_ in cases:
+            if case_.max_size is None or size <= case_.max_size:
+                seconds[case_.name][str(size)] = measure(bench, case_,
+                                                         args.repeat)
+        print(f'measured size {size}', flush=True)
+
+    results = {'commit': commit(), 'date': datetime.datetime.utcnow()
+               .isoformat(), 'sizes': sizes, 'cases': {}}
+    failures = []
+    print(f'{"case":<38} {"expected":>8} {"fit":>8} ' +
+          ' '.join(f'{size:>10}' for size in sizes) + '  (us)')
+    for case_ in cases:
+        measured = seconds[case_.name]
+        fitted = None
+        if len(measured) >= 3:
+            fitted = fit([int(size) for size in measured],
+                         list(measured.values()))
+        if case_.expected in SUBLINEAR and fitted not in SUBLINEAR + (None,):
+            failures.append(case_.name)
+        results['cases'][case_.name] = {'expected': case_.expected,
+                                        'fit': fitted, 'seconds': measured}
+        print(f'{case_.name:<38} {case_.expected:>8} {fitted or "-":>8} ' +
+              ' '.join(f'{measured[str(size)] * 1e6:>10.1f}'
+                       if str(size) in measured else f'{"-":>10}'
+                       for size in sizes))
+
+    os.makedirs(RESULTS, exist_ok=True)
+    path = args.output or os.path.join(RESULTS, f'{results["commit"]}.json')
+    with open(path, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f'Saved results to {path}')
+
+    if args.compare:
+        with open(args.compare) as previous:
+            failures += compare(results, json.load(previous), args.tolerance)
+    if failures:
+        print('FAILED: ' + ', '.join(failures))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-size', type=int, default=10 ** 6)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', default='',
+                        help='run only the cases whose name contains this')
+    parser.add_argument('--output')
+    parser.add_argument('--compare',
+                        help='results of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=3.0)
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,142 @@
+"""Soak test running mixed traffic against create_app to catch leaks
+
+Usage: python benchmarks/soak_test.py --duration 7200
+
+Traced memory is sampled together with the number of live objects
+reported by the memory accounting. The test fails when the memory per
+live object grows by more than --tolerance between the first sample
+after warm up and the last one.
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from app.admin import memory  # noqa: E402
+
+HEADER = {'Content-Type': 'application/json'}
+PASSWORD = 'Test1234'
+
+
+class Traffic():
+    """Mixed traffic of a handful of users against one app"""
+    def __init__(self, users, max_businesses):
+        self.app = create_app('testing')
+        self.client = self.app.test_client()
+        self.max_businesses = max_businesses
+        self.counter = 0
+        self.tokens = {}
+        self.owned = {}
+        for number in range(users):
+            email = f'soak{number}@test.com'
+            self.post('/api/v1/register', None,
+                      email=email, username=f'soak {number}',
+                      password=PASSWORD)
+            self.login(email)
+
+    def request(self, method, url, user, **data):
+        headers = dict(HEADER)
+        if user is not None:
+            headers['Authorization'] = 'Bearer ' + self.tokens[user]
+        res = getattr(self.client, method)(url, headers=headers,
+                                           data=json.dumps(data))
+        return res.status_code, res.data
+
+    def post(self, url, user, **data):
+        return self.request('post', url, user, **data)
+
+    def login(self, email):
+        status, body = self.post('/api/v1/login', None, email=email,
+                                 password=PASSWORD)
+        self.tokens[email] = json.loads(body.decode())['access_token']
+
+    def step(self):
+        """Run one randomly chosen operation"""
+        email = random.choice(list(self.tokens))
+        owned = self.owned.setdefault(email, [])
+        choice = random.random()
+        if choice < 0.4:
+            self.client.get('/api/v1/businesses?category=Food')
+        elif choice < 0.6 and owned:
+            self.client.get(f'/api/v1/businesses/{random.choice(owned)}')
+        elif choice < 0.75:
+            self.counter += 1
+            status, body = self.post('/api/v1/businesses', email,
+                                     name=f'Business {self.counter}',
+                                     category='Food', location='Nairobi')
+            if status == 201:
+                owned.append(self.counter)
+        elif choice < 0.85 and owned:
+            self.request('put', f'/api/v1/businesses/{random.choice(owned)}',
+                         email, name=f'Renamed {self.counter}',
+                         category='Food', location='Mombasa')
+        elif choice < 0.97:
+            others = [business for user, businesses in self.owned.items()
+                      if user != email for business in businesses]
+            if others:
+                self.post(f'/api/v1/businesses/{random.choice(others)}'
+                          '/reviews', email, review='Lovely place')
+        else:
+            self.post('/api/v1/logout', email)
+            self.login(email)
+        total = sum(len(businesses) for businesses in self.owned.values())
+        if total > self.max_businesses:
+            owner = max(self.owned, key=lambda user: len(self.owned[user]))
+            business_id = self.owned[owner].pop(0)
+            self.request('delete', f'/api/v1/businesses/{business_id}',
+                         owner, password=PASSWORD)
+
+
+def sample():
+    """Return traced bytes, live objects and bytes per live object"""
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    live = max(memory.account()['total_count'], 1)
+    return current, live, current / live
+
+
+def run(args):
+    traffic = Traffic(args.users, args.max_businesses)
+    tracemalloc.start()
+    start = time.time()
+    next_sample = start + args.warmup
+    baseline = None
+    per_object = 0
+    while time.time() - start < args.duration:
+        traffic.step()
+        if time.time() < next_sample:
+            continue
+        next_sample += args.interval
+        current, live, per_object = sample()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        baseline = baseline or per_object
+        print(f'{time.time() - start:8.0f}s traced={current} live={live} '
+              f'per_object={per_object:.0f} max_rss_kb={rss}', flush=True)
+    if baseline is None:
+        print('The duration should be longer than the warm up')
+        return 1
+    growth = per_object / baseline - 1
+    print(f'Memory per live object grew {growth:.1%}')
+    if growth > args.tolerance:
+        print('FAILED: memory per live object keeps growing')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=3600)
+    parser.add_argument('--warmup', type=float, default=60)
+    parser.add_argument('--interval', type=float, default=60)
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--max-businesses', type=int, default=2000)
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,67 @@
+"""Import or export a running WeConnect instance as newline-delimited JSON
+
+Usage:
+    python bulk.py --email admin@mail.com export directory.ndjson
+    python bulk.py --email admin@mail.com import directory.ndjson
+
+The password is prompted for unless given with --password. Both
+commands stream, so neither the file nor the response is held in memory.
+"""
+import json
+import os
+import shutil
+from urllib.request import Request, urlopen
+
+import click
+
+
+def login(url, email, password):
+    """Return an access token for the administrator"""
+    body = json.dumps({'email': email, 'password': password}).encode()
+    req = Request(f'{url}/api/v1/login', data=body,
+                  headers={'Content-Type': 'application/json'})
+    with urlopen(req) as res:
+        return json.loads(res.read().decode())['access_token']
+
+
+@click.group()
+@click.option('--url', default='http://127.0.0.1:5000',
+              help='Base url of the WeConnect instance')
+@click.option('--email', required=True, help='Administrator email')
+@click.option('--password', prompt=True, hide_input=True,
+              help='Administrator password')
+@click.pass_context
+def cli(ctx, url, email, password):
+    """Bulk import and export of users, businesses and reviews"""
+    ctx.obj = {'url': url.rstrip('/'), 'token': login(url, email, password)}
+
+
+@cli.command('export')
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.pass_obj
+def export_data(obj, path):
+    """Stream the directory into PATH"""
+    req = Request(f'{obj["url"]}/api/v1/admin/export',
+                  headers={'Authorization': 'Bearer ' + obj['token']})
+    with urlopen(req) as res, open(path, 'wb') as ndjson:
+        shutil.copyfileobj(res, ndjson)
+    click.echo(f'Exported to {path}')
+
+
+@cli.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.pass_obj
+def import_data(obj, path):
+    """Stream PATH into the directory"""
+    with open(path, 'rb') as ndjson:
+        req = Request(f'{obj["url"]}/api/v1/admin/import', data=ndjson,
+                      headers={'Authorization': 'Bearer ' + obj['token'],
+                               'Content-Type': 'application/x-ndjson',
+                               'Content-Length': os.path.getsize(path)})
+        with urlopen(req) as res:
+            summary = json.loads(res.read().decode())
+    click.echo(json.dumps(summary, indent=2))
+
+
+if __name__ == '__main__':
+    cli()
@@ -5,6 +5,7 @@
     environments we've specified.
 """
 import os
+import datetime
 
 
 class Config(object):
@@ -13,12 +14,54 @@ class Config(object):
     CSRF_ENABLED = True
     SECRET_KEY = os.getenv('SECRET')
     JWT_BLACKLIST_ENABLED = True
+    JWT_CLAIMS_CACHE_SIZE = 1024
+    JWT_REFRESH_TOKEN_EXPIRES = datetime.timedelta(days=30)
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 465
     MAIL_USE_SSL = True
     MAIL_USERNAME = os.environ.get('EMAIL')
     MAIL_PASSWORD = os.environ.get('PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('EMAIL')
+    ADMINS = [email for email in os.environ.get('ADMINS', '').split(',')
+              if email]
+    IMPORT_BATCH_SIZE = 500
+    EVENTS_BUFFER_SIZE = 1000
+    EVENTS_HEARTBEAT = 15
+    EVENTS_MAX_LISTENERS = 16
+    CHANGES_TOMBSTONE_LIMIT = 1000
+    IDEMPOTENCY_CACHE_SIZE = 10000
+    IDEMPOTENCY_TTL = 86400
+    IDEMPOTENCY_WAIT = 30
+    REPLICATION_ENABLED = os.environ.get('REPLICATION_ENABLED') == 'true'
+    REPLICATION_NODE_ID = os.environ.get('REPLICATION_NODE_ID')
+    REPLICATION_NODE_INDEX = int(os.environ.get('REPLICATION_NODE_INDEX', 0))
+    REPLICATION_NODE_COUNT = int(os.environ.get('REPLICATION_NODE_COUNT', 1))
+    REPLICATION_PEERS = [peer for peer in
+                         os.environ.get('REPLICATION_PEERS', '').split(',')
+                         if peer]
+    REPLICATION_SECRET = os.environ.get('REPLICATION_SECRET')
+    REPLICATION_LOG_SIZE = 100000
+    REPLICATION_POLL_WAIT = 20
+    REPLICATION_MAX_WAITERS = 8
+    REPLICATION_CATCHUP_WAIT = 10
+    REPLICATION_CATCHUP_TIMEOUT = 120
+    ADMISSION_CLASSES = {
+        'hashing': {'limit': int(os.environ.get('HASHING_LIMIT', 4)),
+                    'queue_budget': 2.0}
+    }
+    REVIEWS_ASYNC = os.environ.get('REVIEWS_ASYNC') == 'true'
+    REVIEW_QUEUE_SIZE = 10000
+    REVIEW_BATCH_SIZE = 100
+    REVIEW_STATUS_SIZE = 100000
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0))
+    TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'memory')
+    TRACE_FILE = os.environ.get('TRACE_FILE', 'traces.ndjson')
+    TRACE_BUFFER_SIZE = 1000
+    COMPRESS_ENABLED = True
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_MIN_SIZE = 500
+    COMPRESS_MIMETYPES = ['application/json', 'text/event-stream',
+                          'application/x-ndjson']
 
 
 class DevelopmentConfig(Config):
@@ -8,7 +8,15 @@ import datetime
 from flask_jwt_extended import create_access_token
 from app import create_app
 from app.auth.views import users
+from app.auth.tokens import claims_cache, refresh_tokens
 from app.business.views import store
+from app.business.indexes import names, owners
+from app.events import events
+from app.changes import changes
+from app.idempotency import idempotency
+from app.replication.log import oplog
+from app.analytics import analytics
+from app.business.ingest import review_queue
 from app.models import Business
 
 
@@ -75,6 +83,17 @@ class BaseTestCase(unittest.TestCase):
 
     def tearDown(self):
         """teardown all initialized variables"""
+        review_queue.join(5)
+        review_queue.clear()
         users.clear()
         store.clear()
+        claims_cache.clear()
+        refresh_tokens.clear()
+        events.clear()
+        changes.clear()
+        idempotency.clear()
+        names.clear()
+        owners.clear()
+        oplog.clear()
+        analytics.clear()
         Business.this_id = 0
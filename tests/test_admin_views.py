@@ -0,0 +1,218 @@
+"""Test case for the administrator views"""
+import json
+from app.auth.views import users
+from app.business.views import store
+from app.business.indexes import names, owners
+from app.analytics import analytics
+from tests.base_test_file import BaseTestCase
+
+
+class TestBulkData(BaseTestCase):
+    """Test for the import and export endpoints"""
+    def setUp(self):
+        super().setUp()
+        self.app.config['ADMINS'] = ['user@test.com']
+        self.lines = [
+            {'type': 'user', 'email': 'owner@test.com', 'username': 'owner',
+             'password': 'Test1234'},
+            {'type': 'business', 'business_id': 7, 'business_name': 'iHub',
+             'category': 'IT', 'location': 'Nairobi',
+             'created_by': 'owner@test.com'},
+            {'type': 'review', 'business_id': 7, 'review': 'Great  space'}]
+
+    def import_lines(self, lines):
+        body = ''.join(json.dumps(line) + '\n' for line in lines)
+        res = self.client.post('/api/v1/admin/import', data=body,
+                               headers={
+                                   'Authorization': self.header['Authorization'],
+                                   'Content-Type': 'application/x-ndjson'})
+        return res, json.loads(res.data.decode())
+
+    def test_export(self):
+        """Test export streams one record per line"""
+        res = self.client.get('/api/v1/admin/export', headers=self.header)
+        lines = [json.loads(line) for line in res.data.decode().splitlines()]
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual([line['type'] for line in lines],
+                         ['user', 'business'])
+        self.assertNotIn('password', lines[0])
+
+    def test_export_forbidden(self):
+        """Test only administrators can export"""
+        self.app.config['ADMINS'] = []
+        res = self.client.get('/api/v1/admin/export', headers=self.header)
+        self.assertEqual(res.status_code, 403)
+
+    def test_import(self):
+        """Test import inserts users, businesses and reviews"""
+        res, result = self.import_lines(self.lines)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual((result['users'], result['businesses'],
+                          result['reviews']), (1, 1, 1))
+        self.assertEqual(len(users), 2)
+        self.assertEqual(store[-1].reviews, ['Great space'])
+
+    def test_import_validation_errors(self):
+        """Test invalid lines are reported and skipped"""
+        self.lines[0]['password'] = 'short'
+        self.lines.append({'type': 'business', 'business_name': 'Andela',
+                           'category': 'IT', 'location': 'Nairobi',
+                           'created_by': 'user@test.com'})
+        res, result = self.import_lines(self.lines)
+        self.assertEqual(result['error_count'], 4)
+        self.assertEqual([error['line'] for error in result['errors']],
+                         [1, 2, 3, 4])
+
+    def test_import_type_errors(self):
+        """Test fields of the wrong type are reported, not raised"""
+        self.app.config['IMPORT_BATCH_SIZE'] = 1
+        self.lines[1]['business_id'] = [7]
+        self.lines.append({'type': 'review', 'business_id': 7, 'review': 5})
+        self.lines.append({'type': 'user', 'email': 'other@test.com',
+                           'username': ['other'], 'password': 'Test1234'})
+        res, result = self.import_lines(self.lines)
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(result['errors'],
+                         [{'line': 2, 'message':
+                           'The business_id should be an integer'},
+                          {'line': 3, 'message':
+                           'The business with id 7 is not available'},
+                          {'line': 4, 'message':
+                           'The review should be a string'},
+                          {'line': 5, 'message':
+                           'The username should be a string'}])
+
+    def test_round_trip(self):
+        """Test an export can be imported into an empty instance"""
+        self.import_lines(self.lines)
+        res = self.client.get('/api/v1/admin/export', headers=self.header)
+        exported = [json.loads(line) for line in res.data.decode().splitlines()]
+        users.clear()
+        store.clear()
+        names.clear()
+        owners.clear()
+        analytics.clear()
+        res, result = self.import_lines(exported)
+        self.assertEqual((result['users'], result['businesses'],
+                          result['reviews']), (2, 2, 1))
+
+
+class TestMemoryUsage(BaseTestCase):
+    """Test for the memory accounting endpoint"""
+    def setUp(self):
+        super().setUp()
+        self.app.config['ADMINS'] = ['user@test.com']
+
+    def trace(self, action):
+        res = self.make_request('/api/v1/admin/memory', 'post',
+                                data={'action': action})
+        return res, json.loads(res.data.decode())
+
+    def test_memory_report(self):
+        """Test every structure is reported with a count and a size"""
+        res = self.client.get('/api/v1/admin/memory', headers=self.header)
+        result = json.loads(res.data.decode())
+        self.assertEqual(result['structures']['users']['count'], 1)
+        self.assertEqual(result['structures']['businesses']['count'], 1)
+        self.assertGreater(result['structures']['businesses']['bytes'], 0)
+
+    def test_memory_forbidden(self):
+        """Test only administrators can see memory usage"""
+        self.app.config['ADMINS'] = []
+        res = self.client.get('/api/v1/admin/memory', headers=self.header)
+        self.assertEqual(res.status_code, 403)
+
+    def test_allocation_snapshots(self):
+        """Test the second snapshot is diffed against the first"""
+        res, result = self.trace('snapshot')
+        self.assertEqual(res.status_code, 409)
+        self.trace('start')
+        res, result = self.trace('snapshot')
+        self.assertIsNone(result['diff'])
+        res, result = self.trace('snapshot')
+        self.assertIsNotNone(result['diff'])
+        self.trace('stop')
+
+
+class TestStats(BaseTestCase):
+    """Test for the columnar statistics endpoints"""
+    def setUp(self):
+        super().setUp()
+        self.app.config['ADMINS'] = ['user@test.com', 'reviewer@test.com']
+        for name, category, location in (('Safaricom', 'IT', 'Mombasa'),
+                                         ('Java', 'Food', 'Nairobi'),
+                                         ('KFC', 'Food', 'Nairobi')):
+            self.make_request('/api/v1/businesses', 'post',
+                              data={'name': name, 'category': category,
+                                    'location': location})
+        reviewer = {'email': 'reviewer@test.com', 'username': 'reviewer',
+                    'password': 'Test1234'}
+        self.make_request('/api/v1/register', 'post', data=reviewer)
+        self.get_login_token(reviewer)
+        for business_id, review in ((1, 'Good'), (1, 'Great service'),
+                                    (3, 'Nice')):
+            self.make_request(f'/api/v1/businesses/{business_id}/reviews',
+                              'post', data={'review': review})
+
+    def get_stats(self, url):
+        res = self.client.get(url, headers=self.header)
+        return res, json.loads(res.data.decode())
+
+    def test_businesses_by_category(self):
+        """Test live businesses are counted per category"""
+        self.get_login_token(self.reg_data)
+        self.make_request('/api/v1/businesses/4', 'delete',
+                          data={'password': 'Test1234'})
+        res, result = self.get_stats('/api/v1/admin/stats')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(result['groups'], [{'category': 'IT', 'count': 2},
+                                            {'category': 'Food', 'count': 1}])
+
+    def test_businesses_by_category_and_location(self):
+        """Test businesses are counted per pair of fields"""
+        res, result = self.get_stats(
+            '/api/v1/admin/stats?group_by=category,location')
+        self.assertIn({'category': 'Food', 'location': 'Nairobi',
+                       'count': 2}, result['groups'])
+        self.assertEqual(len(result['groups']), 3)
+
+    def test_invalid_group_by(self):
+        """Test only category and location can be grouped by"""
+        res, result = self.get_stats('/api/v1/admin/stats?group_by=name')
+        self.assertEqual(res.status_code, 400)
+
+    def test_review_stats(self):
+        """Test review volume, lengths and reviewers are aggregated"""
+        res, result = self.get_stats('/api/v1/admin/stats/reviews?bins=2')
+        self.assertEqual(result['review_volume'][0],
+                         {'business_id': 1, 'reviews': 2})
+        self.assertEqual(sum(result['review_lengths']['counts']), 3)
+        self.assertEqual(result['top_reviewers'],
+                         [{'email': 'reviewer@test.com', 'reviews': 3}])
+
+    def test_dead_rows_compacted(self):
+        """Test deleted businesses and their reviews are dropped"""
+        self.get_login_token(self.reg_data)
+        analytics.compact_after = 2
+        try:
+            for business_id in (1, 2):
+                self.make_request(f'/api/v1/businesses/{business_id}',
+                                  'delete', data={'password': 'Test1234'})
+        finally:
+            analytics.compact_after = 1024
+        self.assertEqual((analytics.businesses.size, analytics.reviews.size),
+                         (2, 1))
+        self.get_login_token({'email': 'reviewer@test.com',
+                              'password': 'Test1234'})
+        self.make_request('/api/v1/businesses/4/reviews', 'post',
+                          data={'review': 'Tasty'})
+        res, result = self.get_stats('/api/v1/admin/stats/reviews')
+        self.assertEqual(result['review_volume'],
+                         [{'business_id': 3, 'reviews': 1},
+                          {'business_id': 4, 'reviews': 1}])
+
+    def test_stats_forbidden(self):
+        """Test only administrators can see statistics"""
+        self.app.config['ADMINS'] = []
+        res, result = self.get_stats('/api/v1/admin/stats')
+        self.assertEqual(res.status_code, 403)
@@ -0,0 +1,68 @@
+"""Test case for admission control of CPU heavy endpoints"""
+import json
+from app.admission import EndpointClass, admission
+from tests.base_test_file import BaseTestCase
+
+
+class TestAdmissionControl(BaseTestCase):
+    """Test for shedding hashing requests under load"""
+    def setUp(self):
+        super().setUp()
+        self.hashing = admission.classes['hashing']
+        self.hashing.queue_budget = 0
+
+    def saturate(self):
+        self.hashing.active = self.hashing.limit
+
+    def tearDown(self):
+        super().tearDown()
+        admission.reset()
+
+    def test_login_shed_when_saturated(self):
+        """Test a login is refused with Retry-After during a storm"""
+        self.saturate()
+        res = self.make_request('/api/v1/login', 'post', data=self.reg_data)
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.headers['Retry-After'], '1')
+        self.assertEqual(self.hashing.shed, 1)
+
+    def test_unauthenticated_requests_take_no_slot(self):
+        """Test the token is checked before a hashing slot is taken"""
+        self.saturate()
+        del self.header['Authorization']
+        res = self.make_request('/api/v1/change-password', 'put',
+                                data=self.passwords)
+        self.assertEqual(res.status_code, 401)
+        self.assertEqual(self.hashing.shed, 0)
+
+    def test_cheap_reads_keep_flowing(self):
+        """Test listing businesses is not held back by hashing load"""
+        self.saturate()
+        res = self.client.get('/api/v1/businesses')
+        self.assertEqual(res.status_code, 200)
+
+    def test_admitted_requests_release_their_slot(self):
+        """Test a request frees its slot and is counted when done"""
+        res = self.make_request('/api/v1/login', 'post', data=self.reg_data)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self.hashing.active, 0)
+        self.assertGreater(self.hashing.service_time, 0)
+
+    def test_early_shedding(self):
+        """Test a request expected to wait past the budget is shed at once"""
+        endpoint_class = EndpointClass(limit=1, queue_budget=1)
+        self.assertIsNone(endpoint_class.acquire())
+        endpoint_class.service_time = 5
+        self.assertEqual(endpoint_class.acquire(), 5)
+        endpoint_class.release(1)
+        self.assertIsNone(endpoint_class.acquire())
+
+    def test_metrics(self):
+        """Test administrators can see shed requests"""
+        self.app.config['ADMINS'] = ['user@test.com']
+        self.saturate()
+        self.make_request('/api/v1/login', 'post', data=self.reg_data)
+        res = self.client.get('/api/v1/admin/admission',
+                              headers=self.header)
+        result = json.loads(res.data.decode())
+        self.assertEqual(result['classes']['hashing']['shed'], 1)
@@ -1,5 +1,7 @@
 """Test case for the user"""
 import json
+import time
+from app.auth.tokens import ClaimsCache, claims_cache
 from tests.base_test_file import BaseTestCase
 
 
@@ -80,6 +82,85 @@ class TestLogoutUser(BaseTestCase):
                       msg='Successfully logged out')
 
 
+class TestRefreshToken(BaseTestCase):
+    """Test for the refresh token endpoint"""
+    def setUp(self):
+        super().setUp()
+        self.tokens = self.get_login_token(self.reg_data)
+
+    def refresh(self):
+        header = {'Authorization': 'Bearer ' + self.tokens['refresh_token']}
+        return self.client.post('/api/v1/token/refresh', headers=header)
+
+    def test_login_returns_refresh_token(self):
+        """Test login issues a refresh token with the access token"""
+        self.assertIn('refresh_token', self.tokens)
+
+    def test_refresh_access_token(self):
+        """Test a refresh token gives a working access token"""
+        res = self.refresh()
+        result = json.loads(res.data.decode())
+        self.assertEqual(res.status_code, 200)
+        self.header['Authorization'] = 'Bearer ' + result['access_token']
+        self.business_data['name'] = 'iHub'
+        res = self.make_request('/api/v1/businesses', 'post',
+                                data=self.business_data)
+        self.assertEqual(res.status_code, 201)
+
+    def test_access_token_cannot_refresh(self):
+        """Test an access token is rejected by the refresh endpoint"""
+        self.tokens['refresh_token'] = self.tokens['access_token']
+        self.assertEqual(self.refresh().status_code, 422)
+
+    def test_logout_revokes_refresh_token(self):
+        """Test logging out also revokes the paired refresh token"""
+        self.make_request('/api/v1/logout', 'post', data=None)
+        self.assertEqual(self.refresh().status_code, 401)
+
+    def test_password_change_revokes_refresh_tokens(self):
+        """Test changing the password revokes every refresh token"""
+        self.make_request('/api/v1/change-password', 'put',
+                          data=self.passwords)
+        self.assertEqual(self.refresh().status_code, 401)
+
+
+class TestClaimsCache(BaseTestCase):
+    """Test for the verified claims cache"""
+    def test_claims_cached_after_first_request(self):
+        """Test a verified token is cached for later requests"""
+        self.assertEqual(len(claims_cache), 1)
+        self.business_data['name'] = 'iHub'
+        self.make_request('/api/v1/businesses', 'post',
+                          data=self.business_data)
+        self.assertEqual(len(claims_cache), 1)
+
+    def test_logout_revokes_cached_token(self):
+        """Test a logged out token is rejected even though it was cached"""
+        self.make_request('/api/v1/logout', 'post', data=None)
+        self.assertEqual(len(claims_cache), 0)
+        self.business_data['name'] = 'iHub'
+        res = self.make_request('/api/v1/businesses', 'post',
+                                data=self.business_data)
+        self.assertEqual(res.status_code, 401)
+
+    def test_password_change_revokes_cached_token(self):
+        """Test a token used to change the password is no longer cached"""
+        self.make_request('/api/v1/change-password', 'put',
+                          data=self.passwords)
+        self.assertEqual(len(claims_cache), 0)
+
+    def test_expired_and_evicted_entries(self):
+        """Test expired entries miss and the cache stays bounded"""
+        cache = ClaimsCache()
+        cache.put('expired', {'jti': 'a', 'exp': time.time() - 1}, 2)
+        self.assertIsNone(cache.get('expired'))
+        for number in range(3):
+            cache.put(f'token{number}',
+                      {'jti': str(number), 'exp': time.time() + 60}, 2)
+        self.assertIsNone(cache.get('token0'))
+        self.assertEqual(len(cache), 2)
+
+
 class TestResetPassword(BaseTestCase):
     """Test reset password user endpoint"""
     def reset_password(self, code, msg, data):
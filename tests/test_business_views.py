@@ -1,6 +1,8 @@
 """Test case for business manipulation view"""
 import json
-from app.business.views import store
+from app.business.views import store, publish_change, publish_changes
+from app.business.indexes import names, owners
+from app.changes import changes
 from tests.base_test_file import BaseTestCase
 
 
@@ -52,6 +54,21 @@ class TestPutBusiness(BaseTestCase):
         del self.business_data['category']
         self.edit_business(code=400, msg=['The category should not be missing'])
 
+    def test_update_after_delete_dropped(self):
+        """Test an update racing a delete does not revive the business"""
+        business = owners.find(1)
+        self.make_request('/api/v1/businesses/1', 'delete',
+                          data=self.password)
+        business.name = 'iHub'
+        with self.app.app_context():
+            version = publish_change('business.updated', 1, business)
+        self.assertIsNone(version)
+        self.assertIsNone(owners.find(1))
+        self.assertEqual(names.prefixed('ihub', 10), [])
+        res = self.make_request('/api/v1/businesses/1', 'delete',
+                                data=self.password)
+        self.assertEqual(res.status_code, 404)
+
     def test_non_existing_business(self):
         """Test edit business that is not available"""
         self.automate(url='/api/v1/businesses/2', data=self.business_data, method='put',
@@ -158,6 +175,25 @@ class TestGetBusiness(BaseTestCase):
         result = self.get_business('/api/v1/businesses/10')
         self.assertTrue(result['message'], 'The business 10 is not available')
 
+    def test_sparse_fields(self):
+        """Test get businesses with only the requested fields"""
+        result = self.get_business('/api/v1/businesses' +
+                                   '?fields=business_id,business_name')
+        self.assertEqual(result['businesses'],
+                         [{'business_id': 1, 'business_name': 'Andela'}])
+
+    def test_sparse_fields_single_business(self):
+        """Test get single business with only the requested fields"""
+        result = self.get_business('/api/v1/businesses/1?fields=category')
+        self.assertEqual(result['businesses'], [{'category': 'IT'}])
+
+    def test_unknown_field(self):
+        """Test get businesses with a field that does not exist"""
+        res = self.client.get('/api/v1/businesses?fields=owner')
+        result = json.loads(res.data.decode())
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('The fields should be one of', result['message'])
+
 
 class TestGetReview(BaseTestCase):
     """Test for get reviews endpoint"""
@@ -201,3 +237,157 @@ class TestPostReview(BaseTestCase):
     def test_valid_json_request(self):
         """Test create review request is json format"""
         self.automate(url='/api/v1/businesses/1/reviews', jsons=False, data=self.review_data)
+
+
+class TestBusinessChanges(BaseTestCase):
+    """Test for the delta sync endpoint"""
+    def get_changes(self, since):
+        res = self.client.get(f'/api/v1/businesses/changes?since={since}')
+        return res, json.loads(res.data.decode())
+
+    def test_changes_since_version(self):
+        """Test only businesses changed after the version are returned"""
+        self.business_data['name'] = 'iHub'
+        self.make_request('/api/v1/businesses', 'post',
+                          data=self.business_data)
+        res, result = self.get_changes(1)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(result['version'], 2)
+        self.assertEqual([biz['business_name'] for biz in result['upserts']],
+                         ['iHub'])
+        self.assertEqual(result['deletes'], [])
+
+    def test_delete_leaves_tombstone(self):
+        """Test a deleted business is returned as a tombstone"""
+        self.make_request('/api/v1/businesses/1', 'delete',
+                          data=self.password)
+        res, result = self.get_changes(0)
+        self.assertEqual(result['upserts'], [])
+        self.assertEqual(result['deletes'], [1])
+
+    def test_review_after_delete_dropped(self):
+        """Test a review committed after a delete keeps the tombstone"""
+        business = owners.find(1)
+        self.make_request('/api/v1/businesses/1', 'delete',
+                          data=self.password)
+        with self.app.app_context():
+            versions = publish_changes([('review.created', 1, business,
+                                         {'business_id': 1,
+                                          'review': 'Nice'})])
+        self.assertEqual(versions, [None])
+        changes.record(1, 10, business)
+        res, result = self.get_changes(0)
+        self.assertEqual(result['upserts'], [])
+        self.assertEqual(result['deletes'], [1])
+
+    def test_compacted_changes(self):
+        """Test syncing from before compacted tombstones needs a resync"""
+        with self.app.app_context():
+            changes.tombstone_limit = 0
+            self.make_request('/api/v1/businesses/1', 'delete',
+                              data=self.password)
+            res, result = self.get_changes(0)
+            changes.tombstone_limit = 1000
+        self.assertEqual(res.status_code, 410)
+        self.assertEqual(result['version'], 2)
+
+    def test_invalid_since(self):
+        """Test since should be a version number"""
+        res, result = self.get_changes('yesterday')
+        self.assertEqual(res.status_code, 400)
+
+
+class TestAutocomplete(BaseTestCase):
+    """Test for the business name autocomplete endpoint"""
+    def autocomplete(self, query):
+        res = self.client.get(f'/api/v1/businesses/autocomplete?{query}')
+        return res, json.loads(res.data.decode())
+
+    def create(self, name):
+        self.business_data['name'] = name
+        self.make_request('/api/v1/businesses', 'post',
+                          data=self.business_data)
+
+    def test_prefix_matches(self):
+        """Test names starting with the prefix are suggested in order"""
+        for name in ['Andela  Kigali', 'iHub', 'andes Coffee']:
+            self.create(name)
+        res, result = self.autocomplete('prefix=and')
+        self.assertEqual([biz['business_name'] for biz in result['businesses']],
+                         ['Andela', 'Andela Kigali', 'andes Coffee'])
+        res, result = self.autocomplete('prefix=and&limit=1')
+        self.assertEqual(len(result['businesses']), 1)
+
+    def test_rename_and_delete_update_index(self):
+        """Test renamed and deleted businesses are no longer suggested"""
+        self.make_request('/api/v1/businesses/1', 'put',
+                          data=dict(self.business_data, name='iHub'))
+        res, result = self.autocomplete('prefix=and')
+        self.assertEqual(result['businesses'], [])
+        res, result = self.autocomplete('prefix=IH')
+        self.assertEqual(result['businesses'][0]['business_id'], 1)
+        self.make_request('/api/v1/businesses/1', 'delete',
+                          data=self.password)
+        res, result = self.autocomplete('prefix=ih')
+        self.assertEqual(result['businesses'], [])
+
+    def test_missing_prefix(self):
+        """Test the prefix is required"""
+        res, result = self.autocomplete('limit=5')
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(result['message'],
+                         ['The prefix should not be missing'])
+
+    def test_invalid_limit(self):
+        """Test the limit is bounded"""
+        res, result = self.autocomplete('prefix=a&limit=500')
+        self.assertEqual(res.status_code, 400)
+
+
+class TestOwnerBusinesses(BaseTestCase):
+    """Test for listing the businesses of the current user"""
+    def get_owned(self, query='owner=me'):
+        res = self.client.get(f'/api/v1/businesses?{query}',
+                              headers=self.header)
+        return res, json.loads(res.data.decode())
+
+    def test_only_own_businesses(self):
+        """Test another user's businesses are not listed"""
+        self.reg_data['email'] = 'anotheruser@test.com'
+        self.make_request('/api/v1/register', 'post', data=self.reg_data)
+        self.get_login_token(self.reg_data)
+        self.business_data['name'] = 'iHub'
+        self.make_request('/api/v1/businesses', 'post',
+                          data=self.business_data)
+        res, result = self.get_owned()
+        self.assertEqual(result['total'], 1)
+        self.assertEqual(result['businesses'][0]['business_name'], 'iHub')
+
+    def test_pagination(self):
+        """Test pages follow creation order"""
+        for name in ['iHub', 'Moringa', 'Gearbox']:
+            self.business_data['name'] = name
+            self.make_request('/api/v1/businesses', 'post',
+                              data=self.business_data)
+        res, result = self.get_owned('owner=me&page=2&per_page=3')
+        self.assertEqual(result['total'], 4)
+        self.assertEqual([biz['business_name'] for biz in result['businesses']],
+                         ['Gearbox'])
+
+    def test_deleted_business_not_listed(self):
+        """Test a deleted business leaves the owner index"""
+        self.make_request('/api/v1/businesses/1', 'delete',
+                          data=self.password)
+        res, result = self.get_owned()
+        self.assertEqual(result['total'], 0)
+
+    def test_owner_requires_login(self):
+        """Test owner=me needs an access token"""
+        del self.header['Authorization']
+        res, result = self.get_owned()
+        self.assertEqual(res.status_code, 401)
+
+    def test_other_owner(self):
+        """Test only owner=me is supported"""
+        res, result = self.get_owned('owner=user@test.com')
+        self.assertEqual(res.status_code, 400)
@@ -0,0 +1,50 @@
+"""Test case for single-flight coalescing of GET requests"""
+import json
+import threading
+import time
+from app.coalesce import SingleFlight
+from tests.base_test_file import BaseTestCase
+
+
+class TestSingleFlight(BaseTestCase):
+    """Test for coalescing identical concurrent requests"""
+    def test_concurrent_calls_share_one_result(self):
+        """Test concurrent callers with the same key run fn once"""
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'body'
+
+        def caller():
+            results.append(flights.do('key', compute))
+
+        threads = [threading.Thread(target=caller) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        time.sleep(0.2)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results),
+                         [False, True, True, True, True])
+        self.assertEqual(flights.calls, {})
+
+    def test_listing_reflects_new_version(self):
+        """Test a listing after a change is not served from the old call"""
+        res = self.client.get('/api/v1/businesses')
+        self.assertEqual(len(json.loads(res.data.decode())['businesses']), 1)
+        self.business_data['name'] = 'iHub'
+        self.make_request('/api/v1/businesses', 'post',
+                          data=self.business_data)
+        res = self.client.get('/api/v1/businesses')
+        self.assertEqual(len(json.loads(res.data.decode())['businesses']), 2)
@@ -0,0 +1,62 @@
+"""Test case for response compression"""
+import gzip
+import json
+import zlib
+from app.business.views import store
+from app.compression import compress_stream
+from app.models import Business
+from tests.base_test_file import BaseTestCase
+
+
+class TestCompression(BaseTestCase):
+    """Test for negotiated response compression"""
+    def fill_store(self, count=50):
+        for number in range(count):
+            store.append(Business(f'Business {number}', 'Food', 'Nairobi',
+                                  'user@test.com'))
+
+    def get(self, encoding):
+        return self.client.get('/api/v1/businesses',
+                               headers={'Accept-Encoding': encoding})
+
+    def test_gzip_large_response(self):
+        """Test large responses are gzipped when the client accepts it"""
+        self.fill_store()
+        res = self.get('gzip')
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        result = json.loads(gzip.decompress(res.data).decode())
+        self.assertEqual(len(result['businesses']), 51)
+
+    def test_deflate_large_response(self):
+        """Test deflate is used when it is the only accepted encoding"""
+        self.fill_store()
+        res = self.get('deflate')
+        self.assertEqual(res.headers['Content-Encoding'], 'deflate')
+        result = json.loads(zlib.decompress(res.data).decode())
+        self.assertEqual(len(result['businesses']), 51)
+
+    def test_small_response_not_compressed(self):
+        """Test responses under the size threshold are sent as is"""
+        res = self.get('gzip')
+        self.assertNotIn('Content-Encoding', res.headers)
+        self.assertIn('Accept-Encoding', res.headers['Vary'])
+
+    def test_identity_not_compressed(self):
+        """Test nothing is compressed without Accept-Encoding"""
+        self.fill_store()
+        res = self.get('identity')
+        self.assertNotIn('Content-Encoding', res.headers)
+
+    def test_refused_encoding_not_used(self):
+        """Test an encoding refused with q=0 is not picked through *"""
+        self.fill_store()
+        res = self.get('gzip;q=0, *')
+        self.assertEqual(res.headers['Content-Encoding'], 'deflate')
+        res = self.get('gzip;q=0, deflate;q=0, *')
+        self.assertNotIn('Content-Encoding', res.headers)
+
+    def test_compress_stream(self):
+        """Test streamed chunks decompress back to the original body"""
+        chunks = [b'data: %d\n\n' % number for number in range(100)]
+        body = b''.join(compress_stream(iter(chunks), 'gzip', 6))
+        self.assertEqual(gzip.decompress(body), b''.join(chunks))
@@ -0,0 +1,69 @@
+"""Test case for the business change feed"""
+from app.events import EventLog
+from tests.base_test_file import BaseTestCase
+
+
+class TestBusinessEvents(BaseTestCase):
+    """Test for the server-sent events endpoint"""
+    def read_events(self, last_event_id, count):
+        res = self.client.get('/api/v1/businesses/events', buffered=False,
+                              headers={'Last-Event-ID': last_event_id})
+        stream = iter(res.response)
+        chunks = [next(stream).decode() for _ in range(count)]
+        res.close()
+        return res, chunks
+
+    def test_stream_resumes_after_last_event_id(self):
+        """Test a client receives the events it missed"""
+        self.make_request('/api/v1/businesses/1', 'put',
+                          data=dict(self.business_data, name='iHub'))
+        res, chunks = self.read_events('1', 1)
+        self.assertEqual(res.mimetype, 'text/event-stream')
+        self.assertIn('event: business.updated', chunks[0])
+        self.assertIn('"business_name": "iHub"', chunks[0])
+
+    def test_listeners_are_capped(self):
+        """Test streams beyond the limit are refused until one closes"""
+        self.app.config['EVENTS_MAX_LISTENERS'] = 1
+        first = self.client.get('/api/v1/businesses/events', buffered=False)
+        second = self.client.get('/api/v1/businesses/events', buffered=False)
+        self.assertEqual(second.status_code, 503)
+        first.close()
+        third = self.client.get('/api/v1/businesses/events', buffered=False)
+        self.assertEqual(third.status_code, 200)
+        third.close()
+
+    def test_review_event(self):
+        """Test a new review is published"""
+        self.reg_data['email'] = 'anotheruser@test.com'
+        self.make_request('/api/v1/register', 'post', data=self.reg_data)
+        self.get_login_token(self.reg_data)
+        self.make_request('/api/v1/businesses/1/reviews', 'post',
+                          data=self.review_data)
+        res, chunks = self.read_events('1', 1)
+        self.assertIn('event: review.created', chunks[0])
+
+    def test_review_event_hides_reviewer(self):
+        """Test the public stream does not reveal who wrote a review"""
+        self.reg_data['email'] = 'anotheruser@test.com'
+        self.make_request('/api/v1/register', 'post', data=self.reg_data)
+        self.get_login_token(self.reg_data)
+        self.make_request('/api/v1/businesses/1/reviews', 'post',
+                          data=self.review_data)
+        res, chunks = self.read_events('1', 1)
+        self.assertNotIn('reviewed_by', chunks[0])
+        self.assertNotIn('anotheruser@test.com', chunks[0])
+
+    def test_new_client_starts_at_the_end(self):
+        """Test a client without Last-Event-ID only gets a keep-alive"""
+        res, chunks = self.read_events('', 1)
+        self.assertEqual(chunks, [': keep-alive\n\n'])
+
+    def test_dropped_events_send_reset(self):
+        """Test resuming from an id no longer buffered sends a reset"""
+        log = EventLog(maxlen=2)
+        for number in range(5):
+            log.publish('business.created', {'business_id': number})
+        self.assertIsNone(log.since(1))
+        self.assertEqual([item[0] for item in log.since(3)], [4, 5])
+        self.assertIn('event: reset', next(log.stream(1, 0)))
@@ -0,0 +1,84 @@
+"""Test case for idempotency keys"""
+import json
+import threading
+from app.business.views import store
+from app.idempotency import IdempotencyCache
+from tests.base_test_file import BaseTestCase
+
+
+class TestIdempotencyKey(BaseTestCase):
+    """Test for replaying POST requests sent with an Idempotency-Key"""
+    def post_business(self, key):
+        self.header['Idempotency-Key'] = key
+        return self.make_request('/api/v1/businesses', 'post',
+                                 data=self.business_data)
+
+    def test_retry_is_replayed(self):
+        """Test a retry returns the first response without running again"""
+        self.business_data['name'] = 'iHub'
+        first = self.post_business('key-1')
+        retry = self.post_business('key-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.data, first.data)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(store), 2)
+
+    def test_new_key_runs_again(self):
+        """Test a different key is a different request"""
+        self.business_data['name'] = 'iHub'
+        self.post_business('key-1')
+        res = self.post_business('key-2')
+        self.assertEqual(res.status_code, 409)
+
+    def test_key_reused_with_different_body(self):
+        """Test a key cannot be reused for another request"""
+        self.business_data['name'] = 'iHub'
+        self.post_business('key-1')
+        self.business_data['name'] = 'Moringa'
+        res = self.post_business('key-1')
+        self.assertEqual(res.status_code, 422)
+
+    def test_register_replay(self):
+        """Test a retried registration replays the account creation"""
+        self.header['Idempotency-Key'] = 'register-1'
+        self.reg_data['email'] = 'another@test.com'
+        self.make_request('/api/v1/register', 'post', data=self.reg_data)
+        res = self.make_request('/api/v1/register', 'post',
+                                data=self.reg_data)
+        result = json.loads(res.data.decode())
+        self.assertEqual(result['message'], 'Account created successfully')
+
+    def test_anonymous_keys_are_scoped(self):
+        """Test two anonymous clients reusing a key do not collide"""
+        self.header['Idempotency-Key'] = '1'
+        del self.header['Authorization']
+        self.reg_data['email'] = 'first@test.com'
+        self.make_request('/api/v1/register', 'post', data=self.reg_data)
+        self.reg_data['email'] = 'second@test.com'
+        res = self.make_request('/api/v1/register', 'post',
+                                data=self.reg_data)
+        self.assertEqual(res.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', res.headers)
+
+    def test_concurrent_duplicate_waits(self):
+        """Test a duplicate in flight waits for the original response"""
+        cache = IdempotencyCache()
+        entry, new = cache.begin('key', 'body')
+        duplicate, duplicate_new = cache.begin('key', 'body')
+        self.assertTrue(new)
+        self.assertFalse(duplicate_new)
+        waiter = threading.Thread(target=duplicate.done.wait)
+        waiter.start()
+        cache.finish('key', entry, (b'{}', 201, []))
+        waiter.join(1)
+        self.assertFalse(waiter.is_alive())
+        self.assertEqual(duplicate.response[1], 201)
+
+    def test_bounded_cache(self):
+        """Test the oldest keys are evicted beyond the size limit"""
+        cache = IdempotencyCache(maxsize=2)
+        for number in range(3):
+            entry, _ = cache.begin(number, 'body')
+            cache.finish(number, entry, (b'{}', 201, []))
+        cache.begin(3, 'body')
+        self.assertEqual(list(cache.entries), [2, 3])
@@ -0,0 +1,212 @@
+"""Test case for operation log replication"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import unittest
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+from app.auth.views import users
+from app.business.indexes import owners
+from app.business.views import store
+from app.models import Business
+from app.replication import peers
+from app.replication.apply import apply, advance_business_ids
+from app.replication.log import OpLog, oplog
+from tests.base_test_file import BaseTestCase
+
+
+class TestReplicationLog(BaseTestCase):
+    """Test for recording and applying replicated operations"""
+    def setUp(self):
+        super().setUp()
+        oplog.enabled = True
+        self.app.config['REPLICATION_SECRET'] = 'secret'
+
+    def tearDown(self):
+        super().tearDown()
+        oplog.enabled = False
+
+    def remote(self, origin, origin_seq, op, name, stamp):
+        return {'seq': origin_seq, 'origin': origin,
+                'origin_seq': origin_seq, 'op': op,
+                'args': {'business_id': 50, 'business_name': name,
+                         'category': 'IT', 'location': 'Nairobi',
+                         'created_by': 'user@test.com'},
+                'stamp': [stamp, origin]}
+
+    def created(self):
+        return self.remote('peer', 1, 'business.created', 'iHub', 1)
+
+    def test_local_mutations_are_logged(self):
+        """Test a local mutation is served to peers"""
+        self.business_data['name'] = 'iHub'
+        self.make_request('/api/v1/businesses', 'post',
+                          data=self.business_data)
+        res = self.client.get('/api/v1/replication/log?since=0',
+                              headers={'X-Replication-Secret': 'secret'})
+        result = json.loads(res.data.decode())
+        self.assertEqual([op['op'] for op in result['ops']],
+                         ['business.created'])
+        self.assertEqual(result['last_seq'], 1)
+
+    def test_restart_starts_new_origin(self):
+        """Test a restarted node's operations are not taken as seen"""
+        first = oplog.record('business.created', {'business_id': 60})
+        oplog.epoch, oplog.local_seq = 'restarted', 0
+        second = oplog.record('business.created', {'business_id': 61})
+        self.assertEqual(first['origin_seq'], second['origin_seq'])
+        peer = OpLog()
+        peer.applied[first['origin']] = first['origin_seq']
+        self.assertFalse(peer.seen(second['origin'], second['origin_seq']))
+
+    def test_long_polls_are_capped(self):
+        """Test a long poll beyond the limit returns at once"""
+        self.app.config['REPLICATION_MAX_WAITERS'] = 0
+        start = time.time()
+        res = self.client.get('/api/v1/replication/log?since=0&wait=5',
+                              headers={'X-Replication-Secret': 'secret'})
+        self.assertEqual(res.status_code, 200)
+        self.assertLess(time.time() - start, 1)
+
+    def test_log_requires_secret(self):
+        """Test peers must present the shared secret"""
+        res = self.client.get('/api/v1/replication/log?since=0')
+        self.assertEqual(res.status_code, 403)
+
+    def test_apply_is_idempotent(self):
+        """Test an operation is applied once however often it arrives"""
+        self.assertTrue(apply(self.created()))
+        self.assertFalse(apply(self.created()))
+        self.assertEqual(len(store), 2)
+        self.assertEqual(oplog.ops[-1]['origin'], 'peer')
+
+    def test_last_writer_wins(self):
+        """Test an older update arriving late does not win"""
+        apply(self.created())
+        apply(self.remote('peer', 2, 'business.updated', 'Newer', 3))
+        apply(self.remote('other', 1, 'business.updated', 'Older', 2))
+        self.assertEqual(owners.find(50).name, 'Newer')
+
+    def test_concurrent_registration(self):
+        """Test the same email registered on two nodes resolves to the
+            last writer
+        """
+        self.reg_data['email'] = 'both@test.com'
+        self.make_request('/api/v1/register', 'post', data=self.reg_data)
+        stamp = oplog.stamps[('user', 'both@test.com')]
+        for seq, (when, password_hash) in enumerate(
+                [(stamp[0] + 1, 'newer'), (stamp[0] - 1, 'older')], start=1):
+            apply({'seq': seq, 'origin': 'peer', 'origin_seq': seq,
+                   'op': 'user.registered',
+                   'args': {'email': 'both@test.com', 'username': 'peer',
+                            'password_hash': password_hash},
+                   'stamp': [when, 'peer']})
+        self.assertEqual(users[-1].password, 'newer')
+
+    def test_applied_create_advances_ids(self):
+        """Test local ids continue after the ids applied from peers"""
+        apply(self.created())
+        self.business_data['name'] = 'Moringa'
+        self.make_request('/api/v1/businesses', 'post',
+                          data=self.business_data)
+        self.assertIsNotNone(owners.find(51))
+
+    def test_advance_keeps_stride(self):
+        """Test the next id stays on this node's stride"""
+        Business.id_step, Business.this_id = 2, 1
+        try:
+            advance_business_ids(50)
+            self.assertEqual(Business.this_id + Business.id_step, 51)
+            advance_business_ids(7)
+            self.assertEqual(Business.this_id, 49)
+        finally:
+            Business.id_step = 1
+
+    def test_writes_held_until_caught_up(self):
+        """Test writes get a 503 while the peers are not caught up"""
+        self.app.config['REPLICATION_CATCHUP_WAIT'] = 0
+        peers.catch_up['deadline'] = time.time() + 60
+        peers.caught_up.clear()
+        try:
+            with self.app.test_request_context(method='POST'):
+                self.assertEqual(peers.hold_writes()[1], 503)
+            with self.app.test_request_context(method='GET'):
+                self.assertIsNone(peers.hold_writes())
+            peers.caught_up.set()
+            with self.app.test_request_context(method='POST'):
+                self.assertIsNone(peers.hold_writes())
+        finally:
+            peers.caught_up.set()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestReplicationProcesses(unittest.TestCase):
+    """Test two local processes converge"""
+    def setUp(self):
+        ports = [free_port(), free_port()]
+        self.urls = [f'http://127.0.0.1:{port}' for port in ports]
+        self.processes = []
+        for index, port in enumerate(ports):
+            env = dict(os.environ, REPLICATION_ENABLED='true',
+                       REPLICATION_SECRET='secret',
+                       REPLICATION_NODE_INDEX=str(index),
+                       REPLICATION_NODE_COUNT='2',
+                       REPLICATION_PEERS=self.urls[1 - index],
+                       SECRET=os.environ.get('SECRET') or 'secret')
+            code = ('from app import create_app; '
+                    f'create_app("testing").run(port={port}, '
+                    'use_reloader=False)')
+            self.processes.append(subprocess.Popen(
+                [sys.executable, '-c', code], env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        for url in self.urls:
+            self.wait_for(lambda: self.call(url, '/api/v1/businesses'))
+
+    def tearDown(self):
+        for process in self.processes:
+            process.terminate()
+            process.wait()
+
+    def call(self, url, path, data=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = 'Bearer ' + token
+        body = None if data is None else json.dumps(data).encode()
+        try:
+            with urlopen(Request(url + path, data=body,
+                                 headers=headers)) as res:
+                return json.loads(res.read().decode())
+        except (URLError, ConnectionError):
+            return None
+
+    def wait_for(self, check, timeout=15):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            result = check()
+            if result:
+                return result
+            time.sleep(0.2)
+        self.fail('The nodes did not converge')
+
+    def test_nodes_converge(self):
+        """Test a user registered on one node can work on the other"""
+        first, second = self.urls
+        user = {'email': 'user@test.com', 'username': 'stephen',
+                'password': 'Test1234'}
+        self.wait_for(lambda: self.call(first, '/api/v1/register', user))
+        login = self.wait_for(lambda: self.call(second, '/api/v1/login',
+                                                user))
+        self.call(second, '/api/v1/businesses',
+                  {'name': 'Andela', 'category': 'IT', 'location': 'Nairobi'},
+                  token=login['access_token'])
+        listing = self.wait_for(lambda: self.call(first, '/api/v1/businesses')
+                                .get('businesses'))
+        self.assertEqual(listing[0]['business_id'], 2)
@@ -0,0 +1,92 @@
+"""Test case for write-behind review ingestion"""
+import json
+import threading
+from app.business import views
+from app.business.views import store
+from app.business.ingest import review_queue
+from tests.base_test_file import BaseTestCase
+
+
+class TestReviewIngestion(BaseTestCase):
+    """Test for accepting reviews into the queue and reporting them"""
+    def setUp(self):
+        super().setUp()
+        self.app.config['REVIEWS_ASYNC'] = True
+        self.reg_data['email'] = 'reviewer@test.com'
+        self.make_request('/api/v1/register', 'post', data=self.reg_data)
+        self.get_login_token(self.reg_data)
+
+    def post_review(self, business_id=1):
+        res = self.make_request(f'/api/v1/businesses/{business_id}/reviews',
+                                'post', data=self.review_data)
+        return res, json.loads(res.data.decode())
+
+    def get_status(self, review_id, business_id=1):
+        res = self.client.get(f'/api/v1/businesses/{business_id}/reviews/' +
+                              review_id, headers=self.header)
+        return res, json.loads(res.data.decode())
+
+    def test_review_accepted(self):
+        """Test a review is accepted and becomes visible once applied"""
+        res, result = self.post_review()
+        self.assertEqual(res.status_code, 202)
+        self.assertTrue(res.headers['Location'].endswith(result['review_id']))
+        self.assertTrue(review_queue.join(5))
+        self.assertEqual(store[0].reviews, [self.review_data['review']])
+        res, status = self.get_status(result['review_id'])
+        self.assertEqual(status['status'], 'visible')
+        self.assertEqual(status['version'], 2)
+
+    def test_review_validated_before_queueing(self):
+        """Test invalid reviews are rejected synchronously"""
+        res, result = self.post_review(business_id=10)
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(len(review_queue.statuses), 0)
+
+    def test_business_deleted_before_commit(self):
+        """Test a review for a business deleted meanwhile is rejected"""
+        review_id = review_queue.submit(5, 'Nice', 'reviewer@test.com')
+        self.assertTrue(review_queue.join(5))
+        res, status = self.get_status(review_id, business_id=5)
+        self.assertEqual(status['status'], 'rejected')
+
+    def test_full_queue_sheds(self):
+        """Test reviews are refused with 503 while the queue is full"""
+        review_queue.maxsize = 0
+        try:
+            res, result = self.post_review()
+        finally:
+            review_queue.maxsize = self.app.config['REVIEW_QUEUE_SIZE']
+        self.assertEqual(res.status_code, 503)
+        self.assertEqual(res.headers['Retry-After'], '1')
+
+    def test_status_of_another_user(self):
+        """Test only the reviewer can see the status of a review"""
+        res, result = self.post_review()
+        self.reg_data['email'] = 'user@test.com'
+        self.get_login_token(self.reg_data)
+        res, status = self.get_status(result['review_id'])
+        self.assertEqual(res.status_code, 404)
+
+    def test_batch_takes_change_lock_once(self):
+        """Test a batch of reviews is published under one lock acquisition"""
+        class CountingLock():
+            def __init__(self):
+                self.lock, self.acquired = threading.Lock(), 0
+
+            def __enter__(self):
+                self.acquired += 1
+                return self.lock.__enter__()
+
+            def __exit__(self, *exc):
+                return self.lock.__exit__(*exc)
+
+        change_lock, views.change_lock = views.change_lock, CountingLock()
+        try:
+            review_queue.commit([(str(number), 1, 'Nice', 'reviewer@test.com')
+                                 for number in range(3)])
+            acquired = views.change_lock.acquired
+        finally:
+            views.change_lock = change_lock
+        self.assertEqual(acquired, 1)
+        self.assertEqual(len(store[0].reviews), 3)
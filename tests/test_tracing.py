@@ -0,0 +1,91 @@
+"""Test case for request tracing"""
+import json
+import os
+import tempfile
+from app.tracing import tracer, FileExporter
+from tests.base_test_file import BaseTestCase
+
+
+class TestTracing(BaseTestCase):
+    """Test for trace ids, sampled spans and exporters"""
+    def setUp(self):
+        super().setUp()
+        self.app.config['TRACE_SAMPLE_RATE'] = 1.0
+        tracer.exporter.clear()
+
+    def spans(self):
+        trace = tracer.exporter.traces[-1]
+        return {span['name']: span for span in trace['spans']}
+
+    def test_trace_id_header(self):
+        """Test every response carries a trace id, kept from the request"""
+        self.app.config['TRACE_SAMPLE_RATE'] = 0.0
+        res = self.client.get('/api/v1/businesses')
+        self.assertEqual(len(res.headers['X-Trace-Id']), 32)
+        res = self.client.get('/api/v1/businesses',
+                              headers={'X-Trace-Id': 'abcdef0123456789'})
+        self.assertEqual(res.headers['X-Trace-Id'], 'abcdef0123456789')
+        self.assertEqual(len(tracer.exporter.traces), 0)
+
+    def test_login_spans(self):
+        """Test validation, bcrypt and token spans nest under the request"""
+        res = self.make_request('/api/v1/login', 'post', data=self.reg_data)
+        trace = tracer.exporter.traces[-1]
+        self.assertEqual(trace['trace_id'], res.headers['X-Trace-Id'])
+        spans = self.spans()
+        root = spans['POST /api/v1/login']
+        self.assertIsNone(root['parent_id'])
+        self.assertEqual(root['attributes']['status'], 200)
+        for name in ('validate.json', 'validate.null', 'store.users',
+                     'bcrypt.check', 'jwt.encode', 'compress'):
+            self.assertEqual(spans[name]['parent_id'], root['span_id'])
+            self.assertLessEqual(spans[name]['duration'], root['duration'])
+
+    def test_jwt_spans(self):
+        """Test a token is decoded once, then served from the cache"""
+        self.get_login_token(self.reg_data)
+        self.client.get('/api/v1/businesses?owner=me', headers=self.header)
+        spans = self.spans()
+        self.assertEqual(spans['jwt.blacklist']['parent_id'],
+                         spans['jwt.decode']['span_id'])
+        self.assertEqual(spans['serialize']['parent_id'],
+                         spans['GET /api/v1/businesses']['span_id'])
+        self.client.get('/api/v1/businesses?owner=me', headers=self.header)
+        spans = self.spans()
+        self.assertIn('jwt.cache', spans)
+        self.assertNotIn('jwt.decode', spans)
+
+    def test_scan_and_serialize_spans(self):
+        """Test finding a business and serializing it are timed apart"""
+        self.client.get('/api/v1/businesses/1')
+        spans = self.spans()
+        root = spans['GET /api/v1/businesses/<int:business_id>']
+        self.assertEqual(spans['store.find']['parent_id'], root['span_id'])
+        self.assertEqual(spans['serialize']['parent_id'], root['span_id'])
+
+    def test_file_exporter(self):
+        """Test traces are appended to a file as JSON lines"""
+        handle, path = tempfile.mkstemp()
+        os.close(handle)
+        tracer.exporter = FileExporter(path)
+        try:
+            self.client.get('/api/v1/businesses/1')
+            self.client.get('/api/v1/businesses/1')
+            with open(path) as traces:
+                lines = [json.loads(line) for line in traces]
+        finally:
+            os.remove(path)
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[0]['spans'][0]['name'],
+                         'GET /api/v1/businesses/<int:business_id>')
+
+    def test_recent_traces(self):
+        """Test administrators can read the traces kept in memory"""
+        self.app.config['ADMINS'] = ['user@test.com']
+        self.client.get('/api/v1/businesses/1')
+        res = self.client.get('/api/v1/admin/traces?limit=1',
+                              headers=self.header)
+        result = json.loads(res.data.decode())
+        self.assertEqual(len(result['traces']), 1)
+        self.assertEqual(result['traces'][0]['spans'][0]['name'],
+                         'GET /api/v1/businesses/<int:business_id>')